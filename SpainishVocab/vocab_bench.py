@@ -0,0 +1,777 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+import tracemalloc
+
+import vocab_worker
+from vocab_dbpool import DBPool
+from vocab_lemma import dedup_report
+from vocab_priority import hint_clause
+from vocab_export import build_filter_query, count_filter_matches, export_slot, refresh_slots, row_to_export_item
+from vocab_fake_model import FakeModelClient, count_tokens
+from vocab_metrics import METRICS, histogram_quantile, load_snapshots, publish_metrics, summarize
+from vocab_prompts import PROMPT_TEMPLATES, read_token_usage
+from vocab_search import search_words
+from vocab_stats import RECENT_LOGS_QUERY, read_counters, read_recent_logs
+
+# ================= 本地压测 (不调用真实 API) =================
+# python vocab_bench.py pipeline --words 2000 --modes staged fused
+# python vocab_bench.py pipeline --words 5000 --rate-429 0.02 --malformed-rate 0.05 --drop-rate 0.01 --save base.json
+# python vocab_bench.py pipeline --words 5000 --concurrency 40 --batch-size 80 --baseline base.json
+# python vocab_bench.py lease --workers 4 --words 3000
+# python vocab_bench.py stats --rows 44000 1000000
+# python vocab_bench.py export --rows 2000 20000 100000
+# python vocab_bench.py refresh --rows 44000 --changed 20
+# python vocab_bench.py filter --rows 44000 1000000
+# python vocab_bench.py search --queries camion abog "contrato trabajo"
+# python vocab_bench.py prompts --words 2000 --versions v1 v2
+# python vocab_bench.py dashboard --clients 16 --requests 300
+# python vocab_bench.py dedup --words 5000
+# python vocab_bench.py priority --levels A1 A2 B1
+# python vocab_bench.py dashboard --url http://127.0.0.1:5000 --clients 16   (压测正在运行的 dashboard)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(HERE, vocab_worker.SOURCE_FILE)
+
+
+SAMPLE_SEED = 0   # 固定种子: 同样的 --words 每次抽到同一批词, 结果可比
+
+
+def make_sample_source(path, n_words, seed=SAMPLE_SEED):
+    # 语料按级别排序 (前 ~29k 行全是 C2), 取前 N 行只会测到 C2; 改为固定种子随机抽样, 保持原文件顺序
+    with open(CORPUS, 'r', encoding='utf-8') as src:
+        lines = src.readlines()
+    if n_words and n_words < len(lines):
+        picked = sorted(random.Random(seed).sample(range(len(lines)), n_words))
+        lines = [lines[i] for i in picked]
+    with open(path, 'w', encoding='utf-8') as dst:
+        dst.writelines(lines)
+
+
+def prepare_workdir(n_words, config=None):
+    # 在临时目录里建一个全新的 DB, 把 worker 的路径都指过去
+    workdir = tempfile.mkdtemp(prefix="vocab_bench_")
+    vocab_worker.DB_NAME = os.path.join(workdir, "vocab_project.db")
+    vocab_worker.CACHE_DB = os.path.join(workdir, "llm_cache.db")
+    vocab_worker.SOURCE_FILE = os.path.join(workdir, "wordsdata_es.txt")
+    make_sample_source(vocab_worker.SOURCE_FILE, n_words)
+    conn = vocab_worker.init_db()
+    vocab_worker.load_data_to_db(conn)
+    settings = {"worker_status": "running"}
+    settings.update(config or {})
+    conn.executemany("INSERT OR REPLACE INTO app_config (key, value) VALUES (?, ?)", list(settings.items()))
+    conn.commit()
+    conn.close()
+    return workdir
+
+
+def percentile(values, q):
+    if not values: return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_fake_worker(latency, seed=None, monitor=None, **client_options):
+    # 在当前 vocab_worker.DB_NAME 上用假后端跑 worker 直到队列空; 返回 (clients, 耗时秒)
+    # monitor: 可选的协程函数, 与 worker 同时运行, worker 结束后取消
+    clients = []
+
+    def factory(model_name):
+        client = FakeModelClient(model_name, latency=tuple(latency), seed=seed, **client_options)
+        clients.append(client)
+        return client
+
+    async def run():
+        watcher = asyncio.create_task(monitor()) if monitor else None
+        try:
+            await vocab_worker.run_worker(factory, stop_when_idle=True)
+        finally:
+            if watcher: watcher.cancel()
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    return clients, time.perf_counter() - start
+
+
+@contextmanager
+def fake_run(n_words, config=None, latency=(0.2, 0.8), seed=None, monitor=None, **client_options):
+    # 新建临时 DB 跑一轮 worker; with 块里 yield (clients, DB 路径, 耗时秒), 退出时删掉临时目录
+    workdir = prepare_workdir(n_words, config)
+    try:
+        METRICS.reset()
+        clients, elapsed = run_fake_worker(latency, seed, monitor, **client_options)
+        yield clients, vocab_worker.DB_NAME, elapsed
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_pipeline(n_words, mode, args, config=None):
+    saved = (vocab_worker.MAX_WORKERS, vocab_worker.BATCH_SIZE)
+    vocab_worker.MAX_WORKERS = args.concurrency or vocab_worker.MAX_WORKERS
+    vocab_worker.BATCH_SIZE = args.batch_size or vocab_worker.BATCH_SIZE
+    try:
+        with fake_run(n_words, dict(config or {}, pipeline_mode=mode), args.latency, args.seed,
+                      rate_429=args.rate_429, tail_rate=args.tail_rate, tail_latency=args.tail_latency,
+                      malformed_rate=args.malformed_rate, drop_rate=args.drop_rate) as (clients, db_path, elapsed):
+            conn = sqlite3.connect(db_path)
+            done = conn.execute("SELECT count(*) FROM vocab_staging WHERE processed_flag = 1").fetchone()[0]
+            errors = conn.execute("SELECT count(*) FROM vocab_staging WHERE processed_flag = 2 OR (status='keep' AND translated_flag = 2)").fetchone()[0]
+            usage = read_token_usage(conn)
+            conn.close()
+    finally:
+        vocab_worker.MAX_WORKERS, vocab_worker.BATCH_SIZE = saved
+
+    calls = sum(c.calls for c in clients)
+    latencies = [l for c in clients for l in c.latencies]
+    db = [h for (name, labels), h in METRICS.histograms.items() if name == "vocab_db_commit_seconds"]
+    db_sum = sum(h.sum for h in db)
+    db_counts = [sum(col) for col in zip(*[h.counts for h in db])] if db else []
+    return {"mode": mode, "words": done, "errors": errors, "seconds": elapsed, "calls": calls,
+            "words_per_sec": done / elapsed if elapsed else 0,
+            "calls_per_word": calls / done if done else 0,
+            "tokens_per_word": sum(u["prompt_tokens"] + u["output_tokens"] for u in usage) / done if done else 0,
+            "usage": usage,
+            "p50": percentile(latencies, 0.50), "p99": percentile(latencies, 0.99),
+            "db_seconds": db_sum,
+            "db_p99_ms": (histogram_quantile(0.99, db[0].buckets, db_counts) or 0) * 1000 if db else 0}
+
+
+# 与基线比较时, 这些指标变差超过阈值算回归 (True 表示越大越好)
+REGRESSION_KEYS = {"words_per_sec": True, "calls_per_word": False, "tokens_per_word": False, "p99": False, "db_seconds": False}
+
+
+def cmd_pipeline(args):
+    results = [run_pipeline(args.words, mode, args) for mode in args.modes]
+    print(f"\n{'mode':<8} {'words':>7} {'errors':>6} {'sec':>8} {'words/s':>9} {'calls':>6} {'calls/word':>11} {'tok/word':>9} {'p50 s':>7} {'p99 s':>7} {'db s':>7} {'db p99 ms':>10}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['words']:>7} {r['errors']:>6} {r['seconds']:>8.2f} {r['words_per_sec']:>9.1f} {r['calls']:>6} {r['calls_per_word']:>11.3f}"
+              f" {r['tokens_per_word']:>9.1f} {r['p50']:>7.3f} {r['p99']:>7.3f} {r['db_seconds']:>7.3f} {r['db_p99_ms']:>10.2f}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != "func"}, "results": results}, f, indent=2)
+        print(f"💾 结果已保存到 {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = {r["mode"]: r for r in json.load(f)["results"]}
+        regressions = []
+        for r in results:
+            base = baseline.get(r["mode"])
+            if not base: continue
+            for key, higher_is_better in REGRESSION_KEYS.items():
+                if not base.get(key): continue
+                change = (r[key] - base[key]) / base[key]
+                worse = -change if higher_is_better else change
+                marker = "❌" if worse > args.threshold else "  "
+                print(f"{marker} {r['mode']:<8} {key:<15} {base[key]:>10.3f} -> {r[key]:>10.3f} ({change:+.1%})")
+                if worse > args.threshold: regressions.append((r["mode"], key))
+        if regressions:
+            raise SystemExit(f"❌ {len(regressions)} 项指标相对基线退化超过 {args.threshold:.0%}")
+        print("✅ 未发现回归")
+
+
+def _lease_worker(db_path, cache_path, latency, seed, results):
+    vocab_worker.DB_NAME = db_path
+    vocab_worker.CACHE_DB = cache_path
+    clients, _ = run_fake_worker(latency, seed)
+    results.put([item for c in clients for item in c.seen])
+
+
+def cmd_lease(args):
+    # 多个 worker 进程共用一个 DB; 每个进程用独立缓存, 任何重复领取都会表现为重复的模型调用
+    workdir = prepare_workdir(args.words, {"pipeline_mode": args.mode})
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_lease_worker,
+                                     args=(vocab_worker.DB_NAME, os.path.join(workdir, f"cache_{i}.db"), tuple(args.latency), args.seed + i, results))
+             for i in range(args.workers)]
+    start = time.perf_counter()
+    for p in procs: p.start()
+    seen = [item for _ in procs for item in results.get()]
+    for p in procs: p.join()
+    elapsed = time.perf_counter() - start
+
+    conn = sqlite3.connect(vocab_worker.DB_NAME)
+    total = conn.execute("SELECT count(*) FROM vocab_staging").fetchone()[0]
+    unfinished = conn.execute("SELECT count(*) FROM vocab_staging WHERE processed_flag != 1 OR (status='keep' AND translated_flag != 1)").fetchone()[0]
+    leftover_leases = conn.execute("SELECT count(*) FROM vocab_staging WHERE lease_owner IS NOT NULL").fetchone()[0]
+    conn.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    counts = {}
+    for item in seen: counts[item] = counts.get(item, 0) + 1
+    duplicates = sum(1 for n in counts.values() if n > 1)
+    print(f"\nworkers={args.workers} words={total} sec={elapsed:.2f} model_words={len(seen)}")
+    print(f"duplicates={duplicates} unfinished={unfinished} leftover_leases={leftover_leases}")
+    if duplicates or unfinished or leftover_leases:
+        raise SystemExit("❌ lease check failed")
+    print("✅ no duplicate processing")
+
+
+LEGACY_STATS_QUERIES = [
+    "SELECT count(*) FROM vocab_staging",
+    "SELECT count(*) FROM vocab_staging WHERE processed_flag = 1",
+    "SELECT count(*) FROM vocab_staging WHERE processed_flag = 2",
+    "SELECT count(*) FROM vocab_staging WHERE status='keep' AND processed_flag=1",
+    "SELECT count(*) FROM vocab_staging WHERE status='discard' AND processed_flag=1",
+    "SELECT count(*) FROM vocab_staging WHERE status='keep' AND translated_flag=1",
+]
+
+
+BENCH_TAGS = ["office", "hr", "finance", "legal", "it", "ops", "marketing", "transport", "energy", "urban", "comm", "abstract"]
+
+
+def build_synthetic_db(path, n_rows, seed):
+    vocab_worker.DB_NAME = path
+    conn = vocab_worker.init_db()
+    rng = random.Random(seed)
+    levels = ["A1", "A2", "B1", "B2", "C1", "C2"]
+    batch = []
+    for i in range(n_rows):
+        pf = rng.choice([0, 1, 1, 1, 2])
+        status = rng.choice(["keep", "discard"]) if pf == 1 else "pending"
+        tf = rng.choice([0, 1]) if status == "keep" else 0
+        ts = f"2025-01-{1 + i % 28:02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+        tags = json.dumps(rng.sample(BENCH_TAGS, rng.randint(1, 2)) if status == "keep" else [])
+        batch.append((f"w{i:07d}", rng.choice(levels), "hint", tags, status, pf, tf, ts))
+        if len(batch) >= 50000:
+            conn.executemany("INSERT INTO vocab_staging (word, level, hint, tags, status, processed_flag, translated_flag, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO vocab_staging (word, level, hint, tags, status, processed_flag, translated_flag, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+    conn.commit()
+    return conn
+
+
+def time_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def cmd_stats(args):
+    for n_rows in args.rows:
+        workdir = tempfile.mkdtemp(prefix="vocab_bench_")
+        conn = build_synthetic_db(os.path.join(workdir, "vocab_project.db"), n_rows, args.seed)
+
+        # 模拟 worker 写入, 确认触发器维护的计数与全表统计一致
+        words = [(f"w{i:07d}",) for i in random.Random(args.seed).sample(range(n_rows), min(n_rows, 2000))]
+        conn.executemany("UPDATE vocab_staging SET status='keep', processed_flag=1, translated_flag=1 WHERE word=?", words)
+        conn.commit()
+        legacy = [conn.execute(q).fetchone()[0] for q in LEGACY_STATS_QUERIES]
+        counters = read_counters(conn)
+        fast = [counters[k] for k in ("total", "processed", "errors", "kept", "discarded", "translated")]
+        assert legacy == fast, (legacy, fast)
+
+        legacy_ms = time_ms(lambda: [conn.execute(q).fetchone() for q in LEGACY_STATS_QUERIES], args.repeat)
+        counters_ms = time_ms(lambda: read_counters(conn), args.repeat)
+        logs_scan_ms = time_ms(lambda: conn.execute(RECENT_LOGS_QUERY.format(hint="NOT INDEXED"), (50,)).fetchall(), args.repeat)
+        logs_index_ms = time_ms(lambda: read_recent_logs(conn), args.repeat)
+        conn.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+        print(f"rows={n_rows:>8}  counts: {legacy_ms:8.2f} ms -> counters {counters_ms:6.3f} ms | "
+              f"recent logs: scan {logs_scan_ms:8.2f} ms -> index {logs_index_ms:6.3f} ms")
+
+
+def legacy_export(conn, filepath, query, params):
+    # 旧版 do_export: fetchall + 整份 export_data 列表
+    rows = conn.execute(query, params).fetchall()
+    export_data = [row_to_export_item(r) for r in rows]
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write("[\n")
+        total = len(export_data)
+        for i, item in enumerate(export_data):
+            line = json.dumps(item, ensure_ascii=False, separators=(', ', ': '))
+            comma = "," if i < total - 1 else ""
+            f.write(f"  {line}{comma}\n")
+        f.write("]")
+    return len(export_data)
+
+
+def measure_peak(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def cmd_export(args):
+    for n_rows in args.rows:
+        workdir = tempfile.mkdtemp(prefix="vocab_bench_")
+        conn = build_synthetic_db(os.path.join(workdir, "vocab_project.db"), n_rows, args.seed)
+        conn.execute("UPDATE vocab_staging SET status='keep', processed_flag=1, translated_flag=1, tags='[\"basic\"]', "
+                     "definition_cn='释义', phonetic='/fo.ne/', context='Una frase de ejemplo bastante normal.'")
+        conn.commit()
+        conn.row_factory = sqlite3.Row
+        query, params = build_filter_query('all_kept', [])
+
+        legacy_path = os.path.join(workdir, "legacy.json")
+        _, legacy_sec, legacy_mb = measure_peak(lambda: legacy_export(conn, legacy_path, query, params))
+        result, stream_sec, stream_mb = measure_peak(lambda: export_slot(conn, 1, 'all_kept', [], workdir, compress=args.compress))
+        count = result['count']
+        conn.commit()
+        with open(legacy_path, 'rb') as a, open(os.path.join(workdir, "01.json"), 'rb') as b:
+            same = a.read() == b.read()
+        conn.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+        print(f"rows={count:>7}  legacy: {legacy_sec:6.2f}s peak {legacy_mb:7.1f} MB | "
+              f"stream: {stream_sec:6.2f}s peak {stream_mb:5.1f} MB | identical={same}")
+
+
+def cmd_refresh(args):
+    # 6 个按级别导出的槽位; 改动少量词后 refresh 只应重建受影响的槽位
+    workdir = tempfile.mkdtemp(prefix="vocab_bench_")
+    conn = build_synthetic_db(os.path.join(workdir, "vocab_project.db"), args.rows, args.seed)
+    conn.row_factory = sqlite3.Row
+    levels = ["A1", "A2", "B1", "B2", "C1", "C2"]
+
+    start = time.perf_counter()
+    for slot_id, level in enumerate(levels, start=1):
+        export_slot(conn, slot_id, 'level', [level], workdir)
+    conn.commit()
+    full_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    report = refresh_slots(conn, workdir)
+    conn.commit()
+    noop_sec = time.perf_counter() - start
+    assert all(r['action'] == 'skipped' for r in report), report
+
+    # 只改内容不动 updated_at: 同一秒内的修改也要能检测到
+    conn.execute("UPDATE vocab_staging SET definition_cn='nuevo' "
+                 "WHERE word IN (SELECT word FROM vocab_staging WHERE status='keep' AND level='B2' LIMIT ?)", (args.changed,))
+    conn.commit()
+    start = time.perf_counter()
+    report = refresh_slots(conn, workdir)
+    conn.commit()
+    partial_sec = time.perf_counter() - start
+    rebuilt = [r for r in report if r['action'] == 'rebuilt']
+    conn.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"rows={args.rows}  full export of 6 slots: {full_sec * 1000:8.1f} ms")
+    print(f"refresh, nothing changed:          {noop_sec * 1000:8.1f} ms")
+    print(f"refresh, {args.changed} words changed:        {partial_sec * 1000:8.1f} ms  rebuilt={[(r['slot_id'], r['changed'], r['removed']) for r in rebuilt]}")
+
+
+def cmd_filter(args):
+    # 导出预览计数: 旧版 tags LIKE '%"tag"%' 全表匹配 vs word_tags 索引
+    for n_rows in args.rows:
+        workdir = tempfile.mkdtemp(prefix="vocab_bench_")
+        conn = build_synthetic_db(os.path.join(workdir, "vocab_project.db"), n_rows, args.seed)
+        tags = args.tags
+        like_sql = ("SELECT count(*) FROM vocab_staging WHERE status = 'keep' AND (" +
+                    " OR ".join(["tags LIKE ?"] * len(tags)) + ")")
+        like_params = [f'%"{t}"%' for t in tags]
+        export_sql, export_params = build_filter_query('tag', tags, columns="word")
+
+        expected = conn.execute(like_sql, like_params).fetchone()[0]
+        assert count_filter_matches(conn, 'tag', tags) == expected
+        assert len(conn.execute(export_sql, export_params).fetchall()) == expected
+        like_ms = time_ms(lambda: conn.execute(like_sql, like_params).fetchone(), args.repeat)
+        index_ms = time_ms(lambda: count_filter_matches(conn, 'tag', tags), args.repeat)
+        export_ms = time_ms(lambda: conn.execute(export_sql, export_params).fetchall(), args.repeat)
+        level_ms = time_ms(lambda: count_filter_matches(conn, 'level', ["A1", "A2"]), args.repeat)
+        conn.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+        print(f"rows={n_rows:>8} matches={expected:>7}  tag count: LIKE {like_ms:8.2f} ms -> word_tags {index_ms:6.2f} ms | "
+              f"tag rows {export_ms:7.2f} ms | level count {level_ms:6.2f} ms")
+
+
+def cmd_search(args):
+    # 完整语料 (wordsdata_es.txt) + 假翻译, 测 /api/search 的查询耗时
+    workdir = prepare_workdir(0)
+    conn = sqlite3.connect(vocab_worker.DB_NAME)
+    words = [r[0] for r in conn.execute("SELECT word FROM vocab_staging")]
+    conn.executemany("UPDATE vocab_staging SET definition_cn = ?, context = ? WHERE word = ?",
+                     [(f"释义 {w}", f"Uso de {w} en una frase.", w) for w in words])
+    conn.commit()
+    print(f"rows={len(words)}")
+    for query in args.queries:
+        first = search_words(conn, query)
+        page_ms = time_ms(lambda: search_words(conn, query), args.repeat)
+        deep_ms = time_ms(lambda: search_words(conn, query, page=args.deep_page), args.repeat)
+        top = ", ".join(r["word"] for r in first["results"][:3])
+        print(f"{query!r:<22} total={first['total']:>6}  page 1 {page_ms:6.2f} ms | page {args.deep_page} {deep_ms:6.2f} ms | top: {top}")
+    conn.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+def cmd_prompts(args):
+    # 1) 静态: 用语料里的真实 chunk 渲染各版本 prompt, 比较每词输入 token
+    # 2) 端到端: 固定模板版本跑假后端, 从 token_usage 表读出每词总 token (含重发)
+    rows = []
+    with open(CORPUS, 'r', encoding='utf-8') as f:
+        for line in f:
+            parsed = vocab_worker.parse_source_line(line)
+            if parsed: rows.append(parsed)
+            if len(rows) >= args.chunks * args.batch_size: break
+    chunks = [rows[i:i + args.batch_size] for i in range(0, len(rows), args.batch_size)]
+    print(f"静态 prompt 大小 ({len(chunks)} 个 chunk x {args.batch_size} 词, token 为粗估):")
+    for task_type, versions in PROMPT_TEMPLATES.items():
+        for version in args.versions:
+            if version not in versions: continue
+            build = versions[version][0]
+            tokens = sum(count_tokens(build(chunk)) for chunk in chunks)
+            print(f"  {task_type:<10} {version:<4} prompt tokens/word {tokens / len(rows):7.2f}")
+
+    print("\n端到端 (假后端, 输出 token 同样为粗估):")
+    print(f"{'mode':<8} {'version':<8} {'words':>7} {'task':<10} {'calls':>6} {'prompt/word':>12} {'output/word':>12} {'total/word':>11}")
+    for mode in args.modes:
+        for version in args.versions:
+            config = {"prompt_versions": json.dumps({task: version for task in PROMPT_TEMPLATES})}
+            r = run_pipeline(args.words, mode, args, config)
+            for u in r["usage"]:
+                words = u["words"] or 1
+                print(f"{mode:<8} {version:<8} {r['words']:>7} {u['task']:<10} {u['calls']:>6} {u['prompt_tokens'] / words:>12.1f}"
+                      f" {u['output_tokens'] / words:>12.1f} {u['tokens_per_word'] or 0:>11.1f}")
+            print(f"{mode:<8} {version:<8} {'':>7} {'(all)':<10} {r['calls']:>6} {'':>12} {'':>12} {r['tokens_per_word']:>11.1f}")
+
+
+# dashboard 轮询时的请求组合: (名称, 权重, 查询, 是否写)。与 vocab_dashboard 各接口执行的 SQL 相同
+def _q_stats(conn):
+    read_counters(conn)
+    [dict(row) for row in read_recent_logs(conn, 50)]
+
+def _q_config(conn):
+    for key in ("model_name", "pipeline_mode", "rate_limits", "prompt_versions"):
+        conn.execute("SELECT value FROM app_config WHERE key=?", (key,)).fetchone()
+
+def _q_worker_status(conn):
+    conn.execute("SELECT value FROM app_config WHERE key='worker_status'").fetchone()
+
+def _q_slots(conn):
+    conn.execute("SELECT slot_id, filename, count(word) as count FROM word_slots GROUP BY slot_id").fetchall()
+
+def _q_set_status(conn):
+    conn.execute("INSERT OR REPLACE INTO app_config (key, value) VALUES ('worker_status', ?)", ("running",))
+
+DASHBOARD_MIX = [
+    ("stats", 4, _q_stats, False),
+    ("config", 1, _q_config, False),
+    ("worker_status", 2, _q_worker_status, False),
+    ("metrics", 1, lambda conn: summarize(load_snapshots(conn)), False),
+    ("preview", 1, lambda conn: count_filter_matches(conn, "tag", ["legal", "energy"]), False),
+    ("slots", 1, _q_slots, False),
+    ("set_status", 0.2, _q_set_status, True),
+]
+
+DASHBOARD_HTTP_MIX = [
+    ("stats", 4, "/api/stats", None),
+    ("config", 1, "/api/config", None),
+    ("worker_status", 2, "/api/worker_status", None),
+    ("metrics", 1, "/api/metrics", None),
+    ("preview", 1, "/api/preview_export", {"filter_type": "tag", "filter_values": ["legal", "energy"]}),
+    ("slots", 1, "/api/slots", None),
+]
+
+
+def connect_per_request(db_path):
+    # 旧实现 (每个请求 get_db()): connect + PRAGMA + 用完关闭
+    @contextmanager
+    def open_conn(write):
+        conn = sqlite3.connect(db_path)
+        conn.execute('PRAGMA journal_mode=WAL;')
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            if write: conn.commit()
+        finally:
+            conn.close()
+    return open_conn
+
+
+def pooled(pool):
+    def open_conn(write):
+        return pool.writer() if write else pool.reader()
+    return open_conn
+
+
+def fake_worker_writes(db_path, stop, interval=0.05):
+    # 模拟 worker 持续提交, 让读连接每次都要看到新的 WAL 内容
+    conn = sqlite3.connect(db_path, timeout=30)
+    words = [r[0] for r in conn.execute("SELECT word FROM vocab_staging LIMIT 5000")]
+    rng = random.Random(0)
+    while not stop.is_set():
+        conn.executemany("UPDATE vocab_staging SET processed_flag=1, status='keep', updated_at=CURRENT_TIMESTAMP WHERE word=?",
+                         [(w,) for w in rng.sample(words, 20)])
+        conn.commit()
+        time.sleep(interval)
+    conn.close()
+
+
+def run_clients(n_clients, n_requests, mix, do_request, seed):
+    # 每个客户端线程按权重随机挑接口; 返回 {接口: [耗时 ms]} 和总耗时
+    samples = {name: [] for name, *_ in mix}
+    lock = threading.Lock()
+    weights = [m[1] for m in mix]
+
+    def client(i):
+        rng = random.Random(seed + i)
+        local = []
+        for _ in range(n_requests):
+            entry = rng.choices(mix, weights)[0]
+            start = time.perf_counter()
+            do_request(entry)
+            local.append((entry[0], (time.perf_counter() - start) * 1000))
+        with lock:
+            for name, ms in local: samples[name].append(ms)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(n_clients)]
+    start = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return samples, time.perf_counter() - start
+
+
+def print_latency_table(label, samples, elapsed):
+    everything = [ms for values in samples.values() for ms in values]
+    print(f"\n[{label}] {len(everything)} requests in {elapsed:.2f}s = {len(everything) / elapsed:.0f} req/s")
+    print(f"  {'endpoint':<14} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, values in list(samples.items()) + [("(all)", everything)]:
+        if not values: continue
+        print(f"  {name:<14} {len(values):>6} {percentile(values, 0.5):>8.2f} {percentile(values, 0.95):>8.2f}"
+              f" {percentile(values, 0.99):>8.2f} {max(values):>8.2f}")
+
+
+def cmd_dashboard(args):
+    if args.url:
+        def do_request(entry):
+            name, weight, path, body = entry
+            data = json.dumps(body).encode() if body is not None else None
+            req = urllib.request.Request(args.url.rstrip('/') + path, data=data, headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                resp.read()
+        samples, elapsed = run_clients(args.clients, args.requests, DASHBOARD_HTTP_MIX, do_request, args.seed)
+        print_latency_table(args.url, samples, elapsed)
+        return
+
+    # 不起 HTTP 服务: 多线程直接执行各接口的查询, 对比每请求建连接 vs 连接池
+    workdir = tempfile.mkdtemp(prefix="vocab_bench_")
+    db_path = os.path.join(workdir, "vocab_project.db")
+    conn = build_synthetic_db(db_path, args.rows, args.seed)
+    publish_metrics(conn, "bench-worker")
+    conn.commit()
+    conn.close()
+    print(f"rows={args.rows} clients={args.clients} requests/client={args.requests} (后台模拟 worker 每 50 ms 提交一次)")
+
+    for label in ("connect", "pool"):
+        pool = DBPool(db_path) if label == "pool" else None
+        open_conn = pooled(pool) if pool else connect_per_request(db_path)
+
+        def do_request(entry):
+            name, weight, query, write = entry
+            with open_conn(write) as conn:
+                query(conn)
+
+        stop = threading.Event()
+        writer = threading.Thread(target=fake_worker_writes, args=(db_path, stop))
+        writer.start()
+        try:
+            samples, elapsed = run_clients(args.clients, args.requests, DASHBOARD_MIX, do_request, args.seed)
+        finally:
+            stop.set()
+            writer.join()
+        print_latency_table("connect per request" if label == "connect" else f"DBPool (opened {pool.created} connections)", samples, elapsed)
+        if pool: pool.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+def cmd_dedup(args):
+    # 1) 完整语料的聚类统计; 2) 前 N 个词端到端跑 staged 流水线, 对比去重开/关时发给模型的词数
+    workdir = prepare_workdir(0)
+    conn = sqlite3.connect(vocab_worker.DB_NAME)
+    report = dedup_report(conn, examples=args.examples)
+    conn.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+    print(f"\n完整语料: {report['words']} 词 -> {report['clusters']} 簇")
+    print(f"  只折叠大小写/重音可省: {report['saved_case_accent']} 词")
+    print(f"  再加单复数/阴阳性可省: {report['saved_total']} 词 ({report['saved_ratio']:.1%} 的分类调用词数)")
+    for cluster in report["examples"]:
+        print(f"    {' / '.join(cluster)}")
+
+    results = []
+    saved_flag = vocab_worker.LEMMA_DEDUP
+    try:
+        for enabled in (False, True):
+            vocab_worker.LEMMA_DEDUP = enabled
+            with fake_run(args.words, latency=args.latency, seed=args.seed) as (clients, db_path, elapsed):
+                conn = sqlite3.connect(db_path)
+                done, kept = conn.execute("SELECT sum(processed_flag = 1), sum(status = 'keep' AND translated_flag = 1) FROM vocab_staging").fetchone()
+                usage = read_token_usage(conn)
+                conn.close()
+            seen = [kind for c in clients for kind, w in c.seen]
+            results.append({"dedup": enabled, "seconds": elapsed, "classified": done, "translated": kept,
+                            "classify_sent": seen.count("classify"), "translate_sent": seen.count("translate"),
+                            "calls": sum(c.calls for c in clients),
+                            "tokens": sum(u["prompt_tokens"] + u["output_tokens"] for u in usage)})
+    finally:
+        vocab_worker.LEMMA_DEDUP = saved_flag
+
+    print(f"\n端到端 staged, 前 {args.words} 词 (假后端):")
+    print(f"{'dedup':<6} {'classified':>10} {'classify sent':>14} {'translate sent':>15} {'calls':>6} {'tokens':>8} {'sec':>7}")
+    for r in results:
+        print(f"{'on' if r['dedup'] else 'off':<6} {r['classified']:>10} {r['classify_sent']:>14} {r['translate_sent']:>15} {r['calls']:>6} {r['tokens']:>8} {r['seconds']:>7.2f}")
+    off, on = results
+    if off["classify_sent"]:
+        print(f"分类发送词数 -{1 - on['classify_sent'] / off['classify_sent']:.1%}, 总 token -{1 - on['tokens'] / max(1, off['tokens']):.1%}")
+
+
+def target_done(conn, hint):
+    # 目标集合端到端完成: 全部分类过, 且保留的词都翻译完
+    clause, params = hint_clause(hint)
+    pending = conn.execute(f"""SELECT count(*) FROM vocab_staging WHERE {clause}
+                               AND (processed_flag = 0 OR (status = 'keep' AND translated_flag = 0))""", params).fetchone()[0]
+    return pending == 0
+
+
+def cmd_priority(args):
+    # 完整语料跑 staged 流水线, 比较有/无优先级提示时目标级别的词端到端完成所需时间
+    hint = {"type": "level", "values": args.levels, "label": "levels " + "/".join(args.levels)}
+    results = []
+    for use_hint in (False, True):
+        config = {"priority_hints": json.dumps([hint])} if use_hint else {}
+        marks = {}
+
+        async def monitor():
+            start = time.perf_counter()
+            conn = sqlite3.connect(vocab_worker.DB_NAME)
+            try:
+                while "target" not in marks:
+                    await asyncio.sleep(0.25)
+                    if target_done(conn, hint): marks["target"] = time.perf_counter() - start
+            finally:
+                conn.close()
+
+        with fake_run(args.words, config, args.latency, args.seed, monitor) as (clients, db_path, elapsed):
+            conn = sqlite3.connect(db_path)
+            clause, params = hint_clause(hint)
+            matched = conn.execute(f"SELECT count(*) FROM vocab_staging WHERE {clause}", params).fetchone()[0]
+            conn.close()
+        marks["total"] = elapsed
+        results.append({"hint": use_hint, "matched": matched, "target": marks.get("target", marks["total"]), "total": marks["total"],
+                        "calls": sum(c.calls for c in clients)})
+
+    print(f"\n目标: {hint['label']} (假后端, 延迟 {args.latency[0]}-{args.latency[1]} s)")
+    print(f"{'priority':<9} {'matched':>8} {'target done s':>14} {'all done s':>11} {'calls':>6}")
+    for r in results:
+        print(f"{'on' if r['hint'] else 'off':<9} {r['matched']:>8} {r['target']:>14.2f} {r['total']:>11.2f} {r['calls']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vocab pipeline benchmarks (fake model backend)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("pipeline", help="端到端跑 worker, 比较 staged / fused 吞吐")
+    p.add_argument("--words", type=int, default=2000)
+    p.add_argument("--modes", nargs="+", default=["staged", "fused"])
+    p.add_argument("--latency", type=float, nargs=2, default=[0.2, 0.8], metavar=("MIN", "MAX"))
+    p.add_argument("--tail-rate", type=float, default=0.0, help="长尾请求比例")
+    p.add_argument("--tail-latency", type=float, default=2.0, help="长尾请求的最短耗时 (秒)")
+    p.add_argument("--rate-429", type=float, default=0.0)
+    p.add_argument("--malformed-rate", type=float, default=0.0, help="返回截断 JSON 的比例")
+    p.add_argument("--drop-rate", type=float, default=0.0, help="每个词被漏掉的概率")
+    p.add_argument("--concurrency", type=int, default=0, help="覆盖 MAX_WORKERS")
+    p.add_argument("--batch-size", type=int, default=0, help="覆盖 BATCH_SIZE")
+    p.add_argument("--save", help="把结果写成 JSON, 作为之后比较的基线")
+    p.add_argument("--baseline", help="与之前保存的 JSON 比较")
+    p.add_argument("--threshold", type=float, default=0.10, help="退化超过该比例视为回归")
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=cmd_pipeline)
+
+    p = sub.add_parser("lease", help="多进程 worker 抢同一个 DB, 检查零重复处理")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--words", type=int, default=3000)
+    p.add_argument("--mode", default="staged")
+    p.add_argument("--latency", type=float, nargs=2, default=[0.05, 0.3], metavar=("MIN", "MAX"))
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=cmd_lease)
+
+    p = sub.add_parser("stats", help="/api/stats 查询: 全表 count(*) vs 计数表")
+    p.add_argument("--rows", type=int, nargs="+", default=[44000, 1000000])
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("export", help="槽位导出: fetchall 旧实现 vs 流式导出的峰值内存")
+    p.add_argument("--rows", type=int, nargs="+", default=[2000, 20000, 100000])
+    p.add_argument("--no-compress", dest="compress", action="store_false")
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("refresh", help="增量刷新槽位: 无变化 / 少量变化时的耗时")
+    p.add_argument("--rows", type=int, default=44000)
+    p.add_argument("--changed", type=int, default=20)
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=cmd_refresh)
+
+    p = sub.add_parser("filter", help="按标签/级别的导出预览计数耗时")
+    p.add_argument("--rows", type=int, nargs="+", default=[44000, 1000000])
+    p.add_argument("--tags", nargs="+", default=["legal", "energy"])
+    p.add_argument("--repeat", type=int, default=10)
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=cmd_filter)
+
+    p = sub.add_parser("search", help="FTS5 全文检索耗时 (完整语料)")
+    p.add_argument("--queries", nargs="+", default=["camion", "ca", "abog", "contrato trabajo", "lawyer", "frase"])
+    p.add_argument("--deep-page", type=int, default=20)
+    p.add_argument("--repeat", type=int, default=20)
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser("prompts", help="比较各 prompt 模板版本的每词 token 数")
+    p.add_argument("--words", type=int, default=2000)
+    p.add_argument("--modes", nargs="+", default=["staged", "fused"])
+    p.add_argument("--versions", nargs="+", default=["v1", "v2"])
+    p.add_argument("--chunks", type=int, default=20, help="静态比较用的 chunk 数")
+    p.add_argument("--batch-size", type=int, default=vocab_worker.BATCH_SIZE)
+    p.add_argument("--latency", type=float, nargs=2, default=[0.05, 0.2], metavar=("MIN", "MAX"))
+    p.add_argument("--drop-rate", type=float, default=0.0)
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=cmd_prompts, rate_429=0.0, tail_rate=0.0, tail_latency=2.0, malformed_rate=0.0, concurrency=0)
+
+    p = sub.add_parser("dashboard", help="并发客户端压测 dashboard 接口, 输出延迟分位数")
+    p.add_argument("--rows", type=int, default=44000)
+    p.add_argument("--clients", type=int, default=16)
+    p.add_argument("--requests", type=int, default=300, help="每个客户端的请求数")
+    p.add_argument("--url", help="压测正在运行的 dashboard (例如 http://127.0.0.1:5000); 不指定时直接对比连接层")
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=cmd_dashboard)
+
+    p = sub.add_parser("dedup", help="词形聚类去重: 语料统计 + 端到端发送词数对比")
+    p.add_argument("--words", type=int, default=5000)
+    p.add_argument("--examples", type=int, default=10)
+    p.add_argument("--latency", type=float, nargs=2, default=[0.02, 0.05], metavar=("MIN", "MAX"))
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=cmd_dedup)
+
+    p = sub.add_parser("priority", help="优先级提示: 目标级别端到端完成时间 (有/无提示)")
+    p.add_argument("--words", type=int, default=0, help="0 表示完整语料")
+    p.add_argument("--levels", nargs="+", default=["A1", "A2", "B1"])
+    p.add_argument("--latency", type=float, nargs=2, default=[0.1, 0.4], metavar=("MIN", "MAX"))
+    p.add_argument("--seed", type=int, default=42)
+    p.set_defaults(func=cmd_priority)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import sqlite3
+
+# ================= LLM 响应缓存 (按内容寻址) =================
+# 键 = sha256(model_name, task_type, prompt 模板版本, word, hint), 值 = 该词的单条结果。
+# 单独存放在 llm_cache.db, 不与 worker/dashboard 抢主库的写锁; 超过上限按最近使用时间淘汰。
+# 命中时不立即刷新 last_used: 先记在内存里, 攒够 TOUCH_FLUSH_SIZE 个或下次写入/关闭时一次性写回,
+# 查缓存本身不再每个 chunk 一次提交。WAL + synchronous=NORMAL, 提交不 fsync。
+
+CACHE_DB = "llm_cache.db"
+CACHE_MAX_ENTRIES = 200000
+EVICT_EVERY = 1000        # 每写入多少条检查一次容量
+TOUCH_FLUSH_SIZE = 2000   # 内存里攒多少个命中的键再批量刷新 last_used
+
+
+def cache_key(model_name, task_type, version, word, hint):
+    raw = json.dumps([model_name, task_type, version, word, hint or ""], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=CACHE_DB, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL;')
+        self.conn.execute('PRAGMA synchronous=NORMAL;')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model_name TEXT,
+                task_type TEXT,
+                template_version TEXT,
+                word TEXT,
+                response TEXT,
+                last_used REAL DEFAULT (julianday('now'))
+            )
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_evict = 0
+        self._touched = set()
+
+    def get_many(self, model_name, task_type, version, word_hints):
+        # 返回 {word: 缓存结果}; 命中的键记下来, 稍后批量刷新 last_used
+        keys = {cache_key(model_name, task_type, version, w, h): w for w, h in word_hints}
+        found = {}
+        key_list = list(keys)
+        for i in range(0, len(key_list), 500):
+            part = key_list[i:i + 500]
+            placeholders = ','.join(['?'] * len(part))
+            for key, response in self.conn.execute(f"SELECT key, response FROM llm_cache WHERE key IN ({placeholders})", part):
+                found[keys[key]] = json.loads(response)
+                self._touched.add(key)
+        if len(self._touched) >= TOUCH_FLUSH_SIZE:
+            self.flush_touched()
+            self.conn.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model_name, task_type, version, items):
+        # items: [(word, hint, result_dict)]
+        rows = [(cache_key(model_name, task_type, version, w, h), model_name, task_type, version, w,
+                 json.dumps(res, ensure_ascii=False)) for w, h, res in items]
+        if not rows: return
+        self.flush_touched()
+        self.conn.executemany('''INSERT OR REPLACE INTO llm_cache (key, model_name, task_type, template_version, word, response)
+                                 VALUES (?, ?, ?, ?, ?, ?)''', rows)
+        self._writes_since_evict += len(rows)
+        if self._writes_since_evict >= EVICT_EVERY:
+            self.evict()
+        self.conn.commit()
+
+    def delete_many(self, model_name, task_type, version, word_hints):
+        keys = [(cache_key(model_name, task_type, version, w, h),) for w, h in word_hints]
+        self.conn.executemany("DELETE FROM llm_cache WHERE key = ?", keys)
+        self.conn.commit()
+
+    def flush_touched(self):
+        # 把攒下的命中键一次性刷新 last_used; 由调用方提交
+        if not self._touched: return
+        self.conn.executemany("UPDATE llm_cache SET last_used = julianday('now') WHERE key = ?", [(k,) for k in self._touched])
+        self._touched.clear()
+
+    def evict(self):
+        self._writes_since_evict = 0
+        self._touched = set()
+        total = self.conn.execute("SELECT count(*) FROM llm_cache").fetchone()[0]
+        overflow = total - self.max_entries
+        if overflow > 0:
+            self.conn.execute("DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)", (overflow,))
+
+    def close(self):
+        self.flush_touched()
+        self.conn.commit()
+        self.conn.close()
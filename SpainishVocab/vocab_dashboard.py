@@ -1,7 +1,17 @@
-from flask import Flask, render_template_string, jsonify, request, send_from_directory
+from flask import Flask, Response, render_template_string, jsonify, request, send_from_directory
 import sqlite3
 import json
 import os
+import time
+
+from vocab_dbpool import DBPool, PoolTimeout
+from vocab_export import BUNDLE_FILE, build_bundle, count_filter_matches, ensure_export_schema, pick_encoded_file, read_manifest, record_slot, refresh_slots, remove_compressed_copies, slot_filename, write_slot_files
+from vocab_metrics import load_snapshots, render_prometheus, summarize
+from vocab_priority import load_hints, normalize_hints, priority_progress
+from vocab_prompts import DEFAULT_PROMPT_VERSIONS, PROMPT_TEMPLATES, read_token_usage
+from vocab_ratelimit import validate_budgets
+from vocab_search import SEARCH_PAGE_SIZE, ensure_search_schema, search_words
+from vocab_stats import read_counters, read_recent_logs
 
 app = Flask(__name__)
 DB_NAME = "vocab_project.db"
@@ -11,12 +21,37 @@ if not os.path.exists(EXPORT_DIR):
     os.makedirs(EXPORT_DIR)
 
 AVAILABLE_MODELS = ["gemini-2.5-flash", "gemini-2.0-flash-exp", "gemini-1.5-flash", "gemini-1.5-pro"]
+PIPELINE_MODES = ["staged", "fused"]
+STREAM_POLL_SECONDS = 0.5        # SSE 检查 data_version 的间隔 (不读表, 几乎零开销)
+STREAM_KEEPALIVE_SECONDS = 15
+BUNDLE_MAX_AGE = 31536000        # 带 ?v=<etag> 的 bundle 请求内容不会变, 可长期缓存
+
+# ==================== 数据库连接 ====================
+# 读请求从池里借长连接, 写请求走唯一的写连接 (见 vocab_dbpool); 所有借出都用 with, 出错也会归还
+def setup_schema(conn):
+    # 第一次请求时在写连接上执行一次; 之后的预览/检索请求只读, 不再每次检查表结构
+    global SEARCH_AVAILABLE
+    ensure_export_schema(conn)
+    SEARCH_AVAILABLE = ensure_search_schema(conn)
+
+SEARCH_AVAILABLE = False
+db = DBPool(DB_NAME, setup=setup_schema)
+
+def read_config(conn, key, default=None):
+    try:
+        row = conn.execute("SELECT value FROM app_config WHERE key=?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        return default   # worker 还没建过表
+    return row['value'] if row else default
+
+def record_slot_locked(written):
+    # 导出文件已在读连接上写好, 这里只短暂持有写锁更新 word_slots / slot_manifests 的差异
+    with db.writer() as conn:
+        return record_slot(conn, written)
 
-def get_db():
-    conn = sqlite3.connect(DB_NAME)
-    conn.execute('PRAGMA journal_mode=WAL;')
-    conn.row_factory = sqlite3.Row
-    return conn
+@app.errorhandler(PoolTimeout)
+def pool_timeout(e):
+    return jsonify({"error": str(e)}), 503
 
 @app.route('/')
 def home():
@@ -29,234 +64,307 @@ def home():
 # ==================== 配置 API ====================
 @app.route('/api/config', methods=['GET', 'POST'])
 def api_config():
-    conn = get_db()
     if request.method == 'POST':
-        new_model = request.json.get('model_name')
+        data = request.json or {}
+        # 每模型限流预算: {"gemini-2.5-flash": {"rpm": 1000, "tpm": 1000000}}, worker 下一轮自动生效
+        # 非法条目 (非对象、rpm/tpm 不是正数) 不写进库里让每个 worker 启动即崩溃; 全部非法时返回 400
+        rate_limits = None
+        if data.get('rate_limits') is not None:
+            rate_limits, skipped = validate_budgets(data['rate_limits'])
+            if skipped and not rate_limits:
+                return jsonify({"error": "Invalid rate_limits", "skipped": skipped}), 400
+            if skipped:
+                print(f"⚠️ rate_limits 里的非法条目已忽略: {'; '.join(skipped)}")
+        with db.writer() as conn:
+            if rate_limits is not None:
+                conn.execute("INSERT OR REPLACE INTO app_config (key, value) VALUES ('rate_limits', ?)", (json.dumps(rate_limits),))
+            # 流水线模式: staged (分类、翻译两次调用, 默认) / fused (一次调用完成)
+            pipeline_mode = data.get('pipeline_mode')
+            if pipeline_mode in PIPELINE_MODES:
+                conn.execute("INSERT OR REPLACE INTO app_config (key, value) VALUES ('pipeline_mode', ?)", (pipeline_mode,))
+            # prompt 模板版本: {"Classify": "v1"} 固定, {"Classify": ["v1", "v2"]} 按 chunk A/B; 未知任务/版本忽略
+            prompt_versions = data.get('prompt_versions')
+            if isinstance(prompt_versions, dict):
+                valid = {}
+                for task, choice in prompt_versions.items():
+                    versions = PROMPT_TEMPLATES.get(task, {})
+                    if isinstance(choice, str) and choice in versions:
+                        valid[task] = choice
+                    elif isinstance(choice, list) and choice and all(v in versions for v in choice):
+                        valid[task] = choice
+                conn.execute("INSERT OR REPLACE INTO app_config (key, value) VALUES ('prompt_versions', ?)", (json.dumps(valid),))
+            new_model = data.get('model_name')
+            if new_model:
+                conn.execute("INSERT OR REPLACE INTO app_config (key, value) VALUES ('model_name', ?)", (new_model,))
         if new_model:
-            conn.execute("INSERT OR REPLACE INTO app_config (key, value) VALUES ('model_name', ?)", (new_model,))
-            conn.commit()
-            conn.close()
             return jsonify({"success": True, "model": new_model})
-    
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT value FROM app_config WHERE key='model_name'")
-        row = cursor.fetchone()
-        current_model = row['value'] if row else "gemini-2.5-flash"
-    except:
-        current_model = "gemini-2.5-flash"
-    conn.close()
-    return jsonify({"current_model": current_model, "available_models": AVAILABLE_MODELS})
+
+    with db.reader() as conn:
+        current_model = read_config(conn, 'model_name', "gemini-2.5-flash")
+        pipeline_mode = read_config(conn, 'pipeline_mode', "staged")
+        try:
+            rate_limits = json.loads(read_config(conn, 'rate_limits', '{}'))
+        except ValueError:
+            rate_limits = {}
+        try:
+            prompt_versions = dict(DEFAULT_PROMPT_VERSIONS, **json.loads(read_config(conn, 'prompt_versions', '{}')))
+        except ValueError:
+            prompt_versions = dict(DEFAULT_PROMPT_VERSIONS)
+    return jsonify({"current_model": current_model, "available_models": AVAILABLE_MODELS,
+                    "pipeline_mode": pipeline_mode, "pipeline_modes": PIPELINE_MODES, "rate_limits": rate_limits,
+                    "prompt_versions": prompt_versions,
+                    "available_prompt_versions": {task: sorted(v) for task, v in PROMPT_TEMPLATES.items()}})
 
 # ★★★ 新增：Worker 状态控制 API ★★★
 @app.route('/api/worker_status', methods=['GET', 'POST'])
 def api_worker_status():
-    conn = get_db()
     if request.method == 'POST':
         # 设置状态 ('running' 或 'paused')
-        new_status = request.json.get('status')
-        if new_status in ['running', 'paused']:
+        new_status = (request.json or {}).get('status')
+        if new_status not in ['running', 'paused']:
+            return jsonify({"error": "Invalid status"}), 400
+        with db.writer() as conn:
             conn.execute("INSERT OR REPLACE INTO app_config (key, value) VALUES ('worker_status', ?)", (new_status,))
-            conn.commit()
-            conn.close()
-            return jsonify({"success": True, "status": new_status})
-        conn.close()
-        return jsonify({"error": "Invalid status"}), 400
-
-    # GET 状态
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT value FROM app_config WHERE key='worker_status'")
-        row = cursor.fetchone()
-        # 默认为 paused，安全第一
-        status = row['value'] if row else "paused"
-    except:
-        status = "paused"
-    conn.close()
+        return jsonify({"success": True, "status": new_status})
+
+    # GET 状态, 默认为 paused，安全第一
+    with db.reader() as conn:
+        status = read_config(conn, 'worker_status', "paused")
     return jsonify({"status": status})
 
 # ==================== 监控 API (含翻译统计) ====================
+def collect_stats(conn):
+    # 基础统计: 直接读触发器维护的计数表
+    counters = read_counters(conn)
+    total = counters.get('total', 0)
+    processed = counters.get('processed', 0)
+    errors = counters.get('errors', 0)
+    kept = counters.get('kept', 0)
+    discarded = counters.get('discarded', 0)
+    translated = counters.get('translated', 0)
+    return {
+        "total": total, 
+        "processed": processed, 
+        "errors": errors,
+        "kept": kept,
+        "discarded": discarded,
+        "translated": translated,
+        "percent_classify": round((processed + errors)/total*100, 1) if total else 0,
+        "percent_translate": round(translated/kept*100, 1) if kept else 0,
+    }
+
 @app.route('/api/stats')
 def api_stats():
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        # 基础统计
-        cursor.execute("SELECT count(*) FROM vocab_staging")
-        total = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT count(*) FROM vocab_staging WHERE processed_flag = 1")
-        processed = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT count(*) FROM vocab_staging WHERE processed_flag = 2")
-        errors = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT count(*) FROM vocab_staging WHERE status='keep' AND processed_flag=1")
-        kept = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT count(*) FROM vocab_staging WHERE status='discard' AND processed_flag=1")
-        discarded = cursor.fetchone()[0]
-        
-        try:
-            cursor.execute("SELECT count(*) FROM vocab_staging WHERE status='keep' AND translated_flag=1")
-            translated = cursor.fetchone()[0]
-        except:
-            translated = 0
-            
-        # ★★★ 修改这里：将 LIMIT 5 改为 LIMIT 50，让日志窗口显示更多内容 ★★★
-        cursor.execute("SELECT word, tags, status, level, updated_at, processed_flag FROM vocab_staging WHERE processed_flag IN (1, 2) ORDER BY updated_at DESC LIMIT 50")
-        recent_logs = [dict(row) for row in cursor.fetchall()]
-        
-        conn.close()
-        
-        return jsonify({
-            "total": total, 
-            "processed": processed, 
-            "errors": errors,
-            "kept": kept,
-            "discarded": discarded,
-            "translated": translated,
-            "percent_classify": round((processed + errors)/total*100, 1) if total else 0,
-            "percent_translate": round(translated/kept*100, 1) if kept else 0,
-            "recent_logs": recent_logs
-        })
+        with db.reader() as conn:
+            stats = collect_stats(conn)
+            # ★★★ 修改这里：将 LIMIT 5 改为 LIMIT 50，让日志窗口显示更多内容 ★★★
+            stats["recent_logs"] = [dict(row) for row in read_recent_logs(conn, 50)]
+        return jsonify(stats)
     except Exception as e:
         return jsonify({"error": str(e)})
 
+# ★★★ SSE 推送: 只有数据库被其他连接提交过 (PRAGMA data_version 变化) 才重新统计 ★★★
+# 每条消息: {"stats": {变化的字段}, "logs": [新出现的日志行]}; 首条消息为完整快照
+@app.route('/api/stream')
+def api_stream():
+    def generate():
+        with db.dedicated_reader() as conn:
+            last_version = None
+            last_stats = {}
+            seen_logs = set()
+            idle_ticks = 0
+            while True:
+                version = conn.execute("PRAGMA data_version").fetchone()[0]
+                if version != last_version:
+                    last_version = version
+                    stats = collect_stats(conn)
+                    delta = {k: v for k, v in stats.items() if last_stats.get(k) != v}
+                    logs = [dict(row) for row in read_recent_logs(conn, 50)]
+                    new_logs = [l for l in logs if (l['word'], l['updated_at']) not in seen_logs]
+                    seen_logs = {(l['word'], l['updated_at']) for l in logs}
+                    last_stats = stats
+                    if delta or new_logs:
+                        yield f"data: {json.dumps({'stats': delta, 'logs': new_logs}, ensure_ascii=False)}\n\n"
+                        idle_ticks = 0
+                idle_ticks += 1
+                if idle_ticks * STREAM_POLL_SECONDS >= STREAM_KEEPALIVE_SECONDS:
+                    # 心跳注释行, 顺便让服务端及时发现已断开的客户端
+                    yield ": keepalive\n\n"
+                    idle_ticks = 0
+                time.sleep(STREAM_POLL_SECONDS)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# ==================== 运行指标 ====================
+# worker 每隔几秒把计数器/直方图快照写进 worker_metrics 表, 这里只负责读取和格式化
+@app.route('/metrics')
+def metrics():
+    with db.reader() as conn:
+        snapshots = load_snapshots(conn)
+    return Response(render_prometheus(snapshots), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics')
+def api_metrics():
+    with db.reader() as conn:
+        snapshots = load_snapshots(conn)
+    return jsonify(summarize(snapshots))
+
+# 每个 (任务, 模型, 模板版本) 累计的 token 用量和每词 token 数, 用于比较模板 A/B
+@app.route('/api/token_usage')
+def api_token_usage():
+    with db.reader() as conn:
+        usage = read_token_usage(conn)
+    return jsonify({"usage": usage})
+
+# ==================== 全文检索 ====================
+# /api/search?q=camion&page=1&per_page=20&status=keep  (忽略重音, 每个词按前缀匹配, bm25 排序)
+@app.route('/api/search')
+def api_search():
+    with db.reader() as conn:
+        if not SEARCH_AVAILABLE:
+            return jsonify({"error": "SQLite FTS5 is not available"}), 501
+        result = search_words(conn, request.args.get('q', ''),
+                              page=request.args.get('page', 1, type=int),
+                              per_page=request.args.get('per_page', SEARCH_PAGE_SIZE, type=int),
+                              status=request.args.get('status'))
+    return jsonify(result)
+
 # ==================== 触发/重置 API ====================
 @app.route('/api/trigger_translate', methods=['POST'])
 def trigger_translate():
     try:
-        conn = get_db()
-        conn.execute("UPDATE vocab_staging SET translated_flag = 0 WHERE status = 'keep'")
-        conn.commit()
-        conn.close()
+        with db.writer() as conn:
+            conn.execute("UPDATE vocab_staging SET translated_flag = 0 WHERE status = 'keep'")
         return jsonify({"success": True, "message": "Translation queue reset."})
     except Exception as e: return jsonify({"error": str(e)})
 
 @app.route('/api/reset_discards', methods=['POST'])
 def reset_discards():
     try:
-        conn = get_db()
-        conn.execute("UPDATE vocab_staging SET status='pending', processed_flag=0, tags='[]' WHERE status='discard'")
-        conn.commit()
-        conn.close()
+        with db.writer() as conn:
+            conn.execute("UPDATE vocab_staging SET status='pending', processed_flag=0, tags='[]' WHERE status='discard'")
         return jsonify({"success": True, "message": "Discarded words reset to Pending."})
     except Exception as e: return jsonify({"error": str(e)})
 
 @app.route('/api/retry_errors', methods=['POST'])
 def retry_errors():
     try:
-        conn = get_db()
-        conn.execute("UPDATE vocab_staging SET processed_flag=0 WHERE processed_flag=2")
-        conn.commit()
-        conn.close()
+        with db.writer() as conn:
+            conn.execute("UPDATE vocab_staging SET processed_flag=0 WHERE processed_flag=2")
         return jsonify({"success": True, "message": "Error items queued for retry."})
     except Exception as e: return jsonify({"error": str(e)})
 
 # ==================== 导出与槽位 ====================
 @app.route('/api/slots')
 def api_slots():
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT slot_id, filename, count(word) as count FROM word_slots GROUP BY slot_id")
-    slots_data = {row['slot_id']: dict(row) for row in cursor.fetchall()}
-    conn.close()
+    with db.reader() as conn:
+        rows = conn.execute("SELECT slot_id, filename, count(word) as count FROM word_slots GROUP BY slot_id").fetchall()
+    slots_data = {row['slot_id']: dict(row) for row in rows}
     return jsonify(slots_data)
 
-def build_filter_query(filter_type, filter_values):
-    query = "SELECT word, level, hint, tags, definition_cn, phonetic, context FROM vocab_staging WHERE status = 'keep'"
-    params = []
-    if not filter_values: return query, params
-
-    if filter_type == 'tag':
-        sub_conditions = []
-        for val in filter_values:
-            sub_conditions.append('tags LIKE ?')
-            params.append(f'%"{val}"%')
-        if sub_conditions: query += f" AND ({' OR '.join(sub_conditions)})"
-            
-    elif filter_type == 'level':
-        placeholders = ','.join(['?'] * len(filter_values))
-        query += f" AND level IN ({placeholders})"
-        params.extend(filter_values)
-        
-    return query, params
-
 @app.route('/api/preview_export', methods=['POST'])
 def preview_export():
     data = request.json
-    conn = get_db()
-    query, params = build_filter_query(data.get('filter_type'), data.get('filter_values', []))
-    cursor = conn.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
-    return jsonify({"count": len(rows)})
+    with db.reader() as conn:
+        count = count_filter_matches(conn, data.get('filter_type'), data.get('filter_values', []))
+    return jsonify({"count": count})
 
 @app.route('/api/do_export', methods=['POST'])
 def do_export():
     data = request.json
     slot_id = int(data.get('slot_id'))
-    filename = f"{slot_id:02d}.json"
-    filepath = os.path.join(EXPORT_DIR, filename)
-    conn = get_db()
-    
-    query, params = build_filter_query(data.get('filter_type'), data.get('filter_values', []))
-    rows = conn.execute(query, params).fetchall()
-    
-    export_data = []
-    for r in rows:
-        cn_def = r['definition_cn'] if r['definition_cn'] else r['hint']
-        item = {
-            "es_term": r['word'],
-            "en_term": r['hint'],
-            "definition": cn_def,
-            "phonetic": r['phonetic'] or "",
-            "context": r['context'] or "",
-            "level": r['level'],
-            "tags": json.loads(r['tags'])
-        }
-        export_data.append(item)
-    
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write("[\n")
-            total = len(export_data)
-            for i, item in enumerate(export_data):
-                line = json.dumps(item, ensure_ascii=False, separators=(', ', ': '))
-                comma = "," if i < total - 1 else ""
-                f.write(f"  {line}{comma}\n")
-            f.write("]")
-    except Exception as e: return jsonify({"error": str(e)})
-        
-    conn.execute("DELETE FROM word_slots WHERE slot_id = ?", (slot_id,))
-    if export_data:
-        conn.executemany("INSERT INTO word_slots (slot_id, word, filename) VALUES (?, ?, ?)", 
-                        [(slot_id, r['word'], filename) for r in rows])
-    conn.commit()
-    conn.close()
+        with db.reader() as conn:
+            written = write_slot_files(conn, slot_id, data.get('filter_type'), data.get('filter_values', []), EXPORT_DIR, compress=data.get('compress', True))
+        result = record_slot_locked(written)
+    except Exception as e:
+        return jsonify({"error": str(e)})
+    build_bundle(EXPORT_DIR)
         
-    return jsonify({"success": True, "message": f"Exported {len(export_data)} words", "filename": filename})
+    return jsonify({"success": True, "message": f"Exported {result['count']} words", "filename": result['filename']})
+
+# ★★★ 优先级调度: 让某个级别/标签/槽位的词插队, worker 下一轮生效 ★★★
+# POST {"hints": [...]} 整体替换 (空列表即清除); POST {"add": {...}} 追加到末尾 (优先级最低)
+# 提示格式见 vocab_priority: {"type": "level"|"tag", "values": [...]} 或 {"type": "slot", "slot_id": 3}
+@app.route('/api/priority', methods=['GET', 'POST'])
+def api_priority():
+    if request.method == 'POST':
+        data = request.json or {}
+        with db.reader() as conn:
+            hints = load_hints(read_config(conn, 'priority_hints'))
+            hints = data['hints'] if isinstance(data.get('hints'), list) else hints + [data.get('add')]
+            hints = normalize_hints(conn, hints)
+        with db.writer() as conn:
+            conn.execute("INSERT OR REPLACE INTO app_config (key, value) VALUES ('priority_hints', ?)", (json.dumps(hints),))
+    with db.reader() as conn:
+        hints = load_hints(read_config(conn, 'priority_hints'))
+        progress = priority_progress(conn, hints)
+    return jsonify({"hints": hints, "progress": progress})
+
+# ★★★ 增量刷新: 按各槽位保存的筛选条件比对内容哈希, 只重建变化的槽位 ★★★
+@app.route('/api/refresh_slots', methods=['POST'])
+def api_refresh_slots():
+    try:
+        with db.reader() as conn:
+            report = refresh_slots(conn, EXPORT_DIR, record=record_slot_locked)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    rebuilt = [r for r in report if r['action'] == 'rebuilt']
+    if rebuilt or read_manifest(EXPORT_DIR) is None: build_bundle(EXPORT_DIR)
+    return jsonify({"success": True, "message": f"Rebuilt {len(rebuilt)} of {len(report)} slots", "slots": report})
 
 @app.route('/api/clear_slot', methods=['POST'])
 def clear_slot():
     try:
         data = request.json
         slot_id = int(data.get('slot_id'))
-        filename = f"{slot_id:02d}.json"
-        filepath = os.path.join(EXPORT_DIR, filename)
+        filepath = os.path.join(EXPORT_DIR, slot_filename(slot_id))
         if os.path.exists(filepath): os.remove(filepath)
-        conn = get_db()
-        conn.execute("DELETE FROM word_slots WHERE slot_id = ?", (slot_id,))
-        conn.commit()
-        conn.close()
+        remove_compressed_copies(filepath)
+        with db.writer() as conn:
+            conn.execute("DELETE FROM word_slots WHERE slot_id = ?", (slot_id,))
+            conn.execute("DELETE FROM slot_manifests WHERE slot_id = ?", (slot_id,))
+        build_bundle(EXPORT_DIR)
         return jsonify({"success": True, "message": "Slot cleared."})
     except Exception as e: return jsonify({"error": str(e)}), 500
 
 @app.route('/api/download/<filename>')
 def download_file(filename):
-    return send_from_directory(EXPORT_DIR, filename, as_attachment=True)
+    # 客户端接受 br/gzip 且有最新的压缩副本时, 直接发送压缩文件
+    stored, encoding = pick_encoded_file(EXPORT_DIR, os.path.basename(filename), request.headers.get('Accept-Encoding', ''))
+    if encoding is None:
+        return send_from_directory(EXPORT_DIR, filename, as_attachment=True)
+    response = send_from_directory(EXPORT_DIR, stored, as_attachment=True, download_name=filename, mimetype='application/json')
+    response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+# ★★★ 阅读器入口: manifest (每次校验) + 合并去重后的 bundle (按 ETag 版本长期缓存) ★★★
+@app.route('/api/manifest')
+def api_manifest():
+    manifest = read_manifest(EXPORT_DIR) or build_bundle(EXPORT_DIR)
+    response = jsonify(manifest)
+    response.set_etag(manifest['bundle']['etag'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/bundle')
+def api_bundle():
+    manifest = read_manifest(EXPORT_DIR) or build_bundle(EXPORT_DIR)
+    etag = manifest['bundle']['etag']
+    stored, encoding = pick_encoded_file(EXPORT_DIR, BUNDLE_FILE, request.headers.get('Accept-Encoding', ''))
+    response = send_from_directory(EXPORT_DIR, stored, mimetype='application/json', conditional=False)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(etag)
+    if request.args.get('v') == etag:
+        response.headers['Cache-Control'] = f'public, max-age={BUNDLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,114 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# ================= Dashboard 连接池 =================
+# 读: 固定数量的长连接 (query_only), 用完放回池里; 每个连接自带 sqlite3 的预编译语句缓存,
+#     轮询接口反复执行的同一条 SQL 不再每次重新 prepare, 也省掉了每个请求的 connect + PRAGMA。
+# 写: 单独一个写连接, 用锁串行化; 正常退出自动 commit, 抛异常自动 rollback, 连接始终归还。
+# 读连接不开显式事务 (只执行 SELECT), 放回池里时不会持有旧快照, 能看到 worker 的最新提交。
+
+READ_POOL_SIZE = 8            # 读连接上限; 超过时请求排队等待空闲连接
+POOL_TIMEOUT = 10.0           # 等待空闲连接/写锁的最长秒数
+STATEMENT_CACHE_SIZE = 256    # 每个连接缓存的预编译语句数 (sqlite3 默认 128)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class DBPool:
+    def __init__(self, db_path, size=READ_POOL_SIZE, timeout=POOL_TIMEOUT, setup=None):
+        # setup(conn): 第一次使用时在写连接上执行一次 (补建 dashboard 依赖的表/索引)
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.setup = setup
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.write_lock = threading.Lock()
+        self.setup_lock = threading.Lock()
+        self.ready = setup is None
+        self.write_conn = None
+        self.created = 0
+
+    def _connect(self, read_only):
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        if read_only:
+            conn.execute('PRAGMA query_only=ON;')
+        else:
+            conn.execute('PRAGMA journal_mode=WAL;')
+            conn.execute('PRAGMA synchronous=NORMAL;')
+        self.created += 1
+        return conn
+
+    def _ensure_ready(self):
+        # setup 失败 (例如 worker 还没建表) 不抛给调用方: 读请求照常拿连接, 各接口按缺表降级, 下次请求再重试
+        if self.ready: return
+        with self.setup_lock:
+            if self.ready: return
+            try:
+                with self.writer() as conn:
+                    self.setup(conn)
+            except Exception as e:
+                print(f"⚠️ 数据库初始化暂未完成, 稍后重试: {e}")
+                return
+            self.ready = True
+
+    @contextmanager
+    def reader(self):
+        self._ensure_ready()
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"no idle read connection within {self.timeout}s")
+        try:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect(read_only=True)
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction: conn.rollback()
+                self.idle.put(conn)
+        finally:
+            self.slots.release()
+
+    @contextmanager
+    def writer(self):
+        if not self.write_lock.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"writer busy for more than {self.timeout}s")
+        try:
+            if self.write_conn is None:
+                self.write_conn = self._connect(read_only=False)
+            conn = self.write_conn
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        finally:
+            self.write_lock.release()
+
+    @contextmanager
+    def dedicated_reader(self):
+        # 长时间占用的读连接 (SSE 推送), 不占池里的名额, 退出时关闭
+        self._ensure_ready()
+        conn = self._connect(read_only=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self.write_lock:
+            if self.write_conn is not None:
+                self.write_conn.close()
+                self.write_conn = None
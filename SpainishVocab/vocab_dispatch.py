@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+# ================= AIMD 并发控制 =================
+# 延迟正常时每完成一个"窗口"的请求, 并发上限 +1 (加性增);
+# 遇到 429 或延迟超标时, 并发上限直接减半 (乘性减)。
+
+class AIMDLimiter:
+    def __init__(self, initial, min_limit=1, max_limit=64, target_latency=30.0, backoff=0.5, cooldown=2.0):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.cooldown = cooldown          # 两次减窗之间的最短间隔, 避免同一波 429 连续砍窗
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+        self._last_cut = 0.0
+
+    @property
+    def window(self):
+        return max(self.min_limit, int(self.limit))
+
+    def available(self):
+        return self.window - self.in_flight
+
+    def on_success(self, latency):
+        if latency > self.target_latency:
+            self._decrease()
+            return
+        self.limit = min(self.max_limit, self.limit + 1.0 / self.window)
+
+    def on_throttle(self):
+        self._decrease()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_cut < self.cooldown:
+            return
+        self._last_cut = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+
+
+# ================= 自适应批大小 =================
+# 每个模型单独维护: 一个窗口内返回完整且延迟充裕时批大小 +step;
+# 丢词率偏高或延迟超标时按 0.7 缩小, 减少一次失败要重发的 token 量。
+
+class AdaptiveBatchSize:
+    def __init__(self, initial, min_size=10, max_size=100, target_latency=30.0, step=5, window=5, min_ratio=0.95):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.step = step
+        self.window = window
+        self.min_ratio = min_ratio
+        self.size = max(min_size, min(initial, max_size))
+        self.samples = []
+
+    def record(self, sent, returned, latency):
+        self.samples.append((sent, returned, latency))
+        if len(self.samples) < self.window:
+            return
+        ratio = sum(s[1] for s in self.samples) / max(1, sum(s[0] for s in self.samples))
+        avg_latency = sum(s[2] for s in self.samples) / len(self.samples)
+        self.samples = []
+        if ratio < self.min_ratio or avg_latency > self.target_latency:
+            self.size = max(self.min_size, int(self.size * 0.7))
+        elif avg_latency < self.target_latency * 0.5:
+            self.size = min(self.max_size, self.size + self.step)
+
+
+# ================= 流水线调度器 =================
+# 任意一个 chunk 完成就立刻补位, 不再等整个 super-batch 跑完 (消除队头阻塞)。
+
+class Dispatcher:
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.pending = set()
+        self.failed = {}
+
+    def has_capacity(self):
+        # 已完成但结果还没取走的 chunk 也占名额: 领取是 await, 期间完成的请求会先释放 in_flight,
+        # 只看 in_flight 会在一轮补位里把整个阶段的词都领光, 结果迟迟不落库, 下一阶段也领不到活
+        return min(self.limiter.available(), self.limiter.window - len(self.pending)) > 0
+
+    def submit(self, coro, failed=None):
+        # failed: 这个 chunk 抛异常时代替结果返回的值 (让调用方把它的词记为错误), 一个坏 chunk 不影响其他 chunk
+        self.limiter.in_flight += 1
+        task = asyncio.ensure_future(coro)
+        task.add_done_callback(self._release)
+        self.pending.add(task)
+        self.failed[task] = failed
+        return task
+
+    def _release(self, task):
+        self.limiter.in_flight -= 1
+
+    async def next_done(self, timeout=None):
+        if not self.pending:
+            return []
+        done, self.pending = await asyncio.wait(self.pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        results = []
+        for task in done:
+            failed = self.failed.pop(task, None)
+            try:
+                results.append(task.result())
+            except Exception as e:
+                print(f"  ❌ chunk 处理异常: {e!r}")
+                if failed is not None: results.append(failed)
+        return results
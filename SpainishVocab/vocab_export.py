@@ -0,0 +1,466 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # brotli 可选, 没装就只生成 .gz
+    brotli = None
+
+# ================= 槽位导出 (流式) =================
+# 游标分批读取 -> 边读边写临时文件 -> 全部成功后原子 rename, 内存占用与槽位大小无关。
+# 写文件 (write_slot_files) 只读, 落库 (record_slot) 只改差异: dashboard 只在后一步持有写锁。
+# 可同时写出 .gz / .br 副本, 供 /api/download 按 Accept-Encoding 直接返回。
+#
+# 每个槽位在 slot_manifests 里记录导出时的筛选条件和内容哈希, word_slots 记录每个词的哈希
+# (导出的各内容列)。refresh_slots 只重算哈希, 内容没变的槽位直接跳过。
+# 不用 updated_at: 它只精确到秒, 同一秒内的两次修改哈希不变, 槽位会被误判为没变。
+#
+# build_bundle 把目录里现有的槽位文件合并去重成一个 bundle.json (附压缩副本), 并写出 manifest.json
+# (各槽位的词数和 ETag)。阅读器先拿 manifest, 再按 ETag 拉取 bundle, 冷启动只需 1~2 个请求。
+
+EXPORT_DIR = "exported_slots"
+PUBLISH_DIR = os.path.join("..", "vocab_data")   # 阅读器 (EptisaLearn.html) 读取的目录
+EXPORT_FETCH_SIZE = 1000
+MANIFEST_FILE = "manifest.json"
+BUNDLE_FILE = "bundle.json"
+SLOT_FILE_RE = re.compile(r"^(\d{2})\.json$")
+
+# (Content-Encoding, 文件后缀), 按优先级排列
+COMPRESSED_VARIANTS = [("br", ".br"), ("gzip", ".gz")] if brotli else [("gzip", ".gz")]
+
+
+EXPORT_COLUMNS = "word, level, hint, tags, definition_cn, phonetic, context, updated_at"
+CONTENT_COLUMNS = ("word", "level", "hint", "tags", "definition_cn", "phonetic", "context")   # 参与词哈希的列
+
+
+# 标签倒排表: 只收录 status='keep' 的词 (导出只看保留词), 由触发器随 tags / status 的写入自动同步,
+# 按标签筛选和计数都走 word_tags 主键, 不再对 tags 做 LIKE 全表扫描
+TAG_SYNC_SQL = """
+    INSERT OR IGNORE INTO word_tags (tag, word)
+    SELECT value, NEW.word FROM json_each(CASE WHEN json_valid(NEW.tags) THEN NEW.tags ELSE '[]' END)
+    WHERE type = 'text' AND NEW.status = 'keep';
+"""
+TAG_TRIGGERS = {
+    "trg_word_tags_insert": f"AFTER INSERT ON vocab_staging BEGIN {TAG_SYNC_SQL} END",
+    "trg_word_tags_update": f"AFTER UPDATE OF tags, status ON vocab_staging BEGIN DELETE FROM word_tags WHERE word = OLD.word; {TAG_SYNC_SQL} END",
+    "trg_word_tags_delete": "AFTER DELETE ON vocab_staging BEGIN DELETE FROM word_tags WHERE word = OLD.word; END",
+}
+
+
+def ensure_export_schema(conn):
+    # 只补建缺失的对象; 预览每次按键都会调用, 已齐全时只有两次只读查询
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    cols = [row[1] for row in conn.execute("PRAGMA table_info(word_slots)")]
+    if "word_hash" not in cols:
+        conn.execute("ALTER TABLE word_slots ADD COLUMN word_hash TEXT")
+    if "slot_manifests" not in existing:
+        conn.execute('''CREATE TABLE IF NOT EXISTS slot_manifests (
+            slot_id INTEGER PRIMARY KEY,
+            filename TEXT,
+            filter_type TEXT,
+            filter_values TEXT,
+            content_hash TEXT,
+            word_count INTEGER,
+            exported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''')
+    if "idx_staging_status_level" not in existing:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_staging_status_level ON vocab_staging (status, level)")
+    if "word_tags" not in existing:
+        conn.execute("CREATE TABLE IF NOT EXISTS word_tags (tag TEXT, word TEXT, PRIMARY KEY (tag, word)) WITHOUT ROWID")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_word_tags_word ON word_tags (word)")
+        backfill_word_tags(conn)
+    for name, body in TAG_TRIGGERS.items():
+        if name not in existing:
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+    conn.commit()
+
+
+def backfill_word_tags(conn):
+    # 从 vocab_staging.tags 的 JSON 全量重建 word_tags (建表时自动执行, 也可手动修复)
+    conn.execute("DELETE FROM word_tags")
+    conn.execute("""
+        INSERT OR IGNORE INTO word_tags (tag, word)
+        SELECT j.value, s.word FROM vocab_staging s,
+               json_each(CASE WHEN json_valid(s.tags) THEN s.tags ELSE '[]' END) j
+        WHERE j.type = 'text' AND s.status = 'keep'
+    """)
+
+
+def build_filter_query(filter_type, filter_values, columns=EXPORT_COLUMNS):
+    query = f"SELECT {columns} FROM vocab_staging WHERE status = 'keep'"
+    params = []
+    if not filter_values: return query, params
+
+    if filter_type == 'tag':
+        # +status 让规划器由 word_tags 驱动按主键回表, 而不是扫描全部 keep 行再逐个匹配
+        placeholders = ','.join(['?'] * len(filter_values))
+        query = f"SELECT {columns} FROM vocab_staging WHERE +status = 'keep' AND word IN (SELECT word FROM word_tags WHERE tag IN ({placeholders}))"
+        params.extend(filter_values)
+
+    elif filter_type == 'level':
+        placeholders = ','.join(['?'] * len(filter_values))
+        query += f" AND level IN ({placeholders})"
+        params.extend(filter_values)
+
+    return query, params
+
+
+def count_filter_matches(conn, filter_type, filter_values):
+    if filter_type == 'tag' and len(filter_values) == 1:
+        return conn.execute("SELECT count(*) FROM word_tags WHERE tag = ?", (filter_values[0],)).fetchone()[0]
+    if filter_type == 'tag' and filter_values:
+        placeholders = ','.join(['?'] * len(filter_values))
+        return conn.execute(f"SELECT count(DISTINCT word) FROM word_tags WHERE tag IN ({placeholders})", list(filter_values)).fetchone()[0]
+    query, params = build_filter_query(filter_type, filter_values, columns="count(*)")
+    return conn.execute(query, params).fetchone()[0]
+
+
+def row_to_export_item(r):
+    cn_def = r['definition_cn'] if r['definition_cn'] else r['hint']
+    return {
+        "es_term": r['word'],
+        "en_term": r['hint'],
+        "definition": cn_def,
+        "phonetic": r['phonetic'] or "",
+        "context": r['context'] or "",
+        "level": r['level'],
+        "tags": json.loads(r['tags'])
+    }
+
+
+def slot_filename(slot_id):
+    return f"{slot_id:02d}.json"
+
+
+class BrotliWriter:
+    def __init__(self, path):
+        self.f = open(path, 'wb')
+        self.compressor = brotli.Compressor()
+
+    def write(self, data):
+        self.f.write(self.compressor.process(data))
+
+    def close(self):
+        self.f.write(self.compressor.finish())
+        self.f.close()
+
+
+def open_writer(path, encoding):
+    if encoding == "gzip": return gzip.open(path, 'wb')
+    if encoding == "br": return BrotliWriter(path)
+    return open(path, 'wb')
+
+
+def word_digest(values):
+    # values: 按 CONTENT_COLUMNS 顺序的列值; NULL 与空串区分开
+    text = "\0".join("\1" if v is None else str(v) for v in values)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class SlotHasher:
+    # 与顺序无关的集合哈希: 各词摘要按 2^128 取模求和, 再拼上词数
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def add(self, digest):
+        self.total = (self.total + int.from_bytes(digest, 'big')) % (1 << 128)
+        self.count += 1
+
+    def hexdigest(self):
+        return f"{self.count}:{self.total:032x}"
+
+
+def compute_slot_hash(conn, filter_type, filter_values):
+    query, params = build_filter_query(filter_type, filter_values, columns=", ".join(CONTENT_COLUMNS))
+    hasher = SlotHasher()
+    for row in conn.execute(query, params):
+        hasher.add(word_digest(tuple(row)))
+    return hasher.hexdigest()
+
+
+def write_slot_files(conn, slot_id, filter_type, filter_values, export_dir=EXPORT_DIR, compress=True):
+    # 第一阶段, 只读: 流式写出槽位文件 (慢, 含压缩副本); 成员 (词, 哈希) 暂存到临时文件, 内存占用仍与槽位大小无关。
+    # 返回交给 record_slot 的结果; 调用方不需要持有写锁
+    query, params = build_filter_query(filter_type, filter_values)
+    filename = slot_filename(slot_id)
+    filepath = os.path.join(export_dir, filename)
+    targets = [(filepath, None)]
+    if compress:
+        targets += [(filepath + ext, encoding) for encoding, ext in COMPRESSED_VARIANTS]
+    writers = []
+    hasher = SlotHasher()
+    members = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+    try:
+        for path, encoding in targets:
+            writers.append(open_writer(path + ".tmp", encoding))
+
+        def emit(text):
+            data = text.encode('utf-8')
+            for w in writers: w.write(data)
+
+        cursor = conn.execute(query, params)
+        count = 0
+        emit("[\n")
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows: break
+            for r in rows:
+                line = json.dumps(row_to_export_item(r), ensure_ascii=False, separators=(', ', ': '))
+                emit(("  " if count == 0 else ",\n  ") + line)
+                count += 1
+                digest = word_digest([r[c] for c in CONTENT_COLUMNS])
+                hasher.add(digest)
+                members.write(f"{digest.hex()}\t{r['word']}\n")
+        emit("\n]" if count else "]")
+        for w in writers: w.close()
+        writers = []
+        for path, encoding in targets:
+            os.replace(path + ".tmp", path)
+    except Exception:
+        members.close()
+        for w in writers:
+            try: w.close()
+            except Exception: pass
+        for path, encoding in targets:
+            if os.path.exists(path + ".tmp"): os.remove(path + ".tmp")
+        raise
+
+    if not compress:
+        # 不压缩时删掉旧的压缩副本, 免得下载到过期内容
+        remove_compressed_copies(filepath)
+    return {"slot_id": slot_id, "filename": filename, "filter_type": filter_type, "filter_values": filter_values or [],
+            "count": count, "content_hash": hasher.hexdigest(), "members": members}
+
+
+def record_slot(conn, written):
+    # 第二阶段, 写连接 (快): 按 write_slot_files 的结果差异更新 word_slots / slot_manifests; 由调用方 commit / rollback
+    slot_id, filename = written["slot_id"], written["filename"]
+    members = written["members"]
+    try:
+        members.seek(0)
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS export_members (word TEXT PRIMARY KEY, word_hash TEXT)")
+        conn.execute("DELETE FROM temp.export_members")
+        conn.executemany("INSERT INTO temp.export_members (word_hash, word) VALUES (?, ?)",
+                         (line.rstrip("\n").split("\t", 1) for line in members))
+    finally:
+        members.close()
+
+    # word_slots 只改差异: 删掉离开槽位的词, 插入新词/更新哈希变化的词
+    removed = conn.execute("DELETE FROM word_slots WHERE slot_id = ? AND word NOT IN (SELECT word FROM temp.export_members)", (slot_id,)).rowcount
+    changed = conn.execute("""
+        INSERT OR REPLACE INTO word_slots (slot_id, word, filename, word_hash)
+        SELECT ?, m.word, ?, m.word_hash FROM temp.export_members m
+        LEFT JOIN word_slots s ON s.slot_id = ? AND s.word = m.word
+        WHERE s.word IS NULL OR s.word_hash IS NOT m.word_hash
+    """, (slot_id, filename, slot_id)).rowcount
+    conn.execute("DELETE FROM temp.export_members")
+    conn.execute("""INSERT OR REPLACE INTO slot_manifests (slot_id, filename, filter_type, filter_values, content_hash, word_count)
+                    VALUES (?, ?, ?, ?, ?, ?)""",
+                 (slot_id, filename, written["filter_type"], json.dumps(written["filter_values"]), written["content_hash"], written["count"]))
+    return {"filename": filename, "count": written["count"], "changed": changed, "removed": removed}
+
+
+def export_slot(conn, slot_id, filter_type, filter_values, export_dir=EXPORT_DIR, compress=True):
+    # 单连接用法 (CLI / 压测): 两个阶段在同一个连接上执行; 由调用方 commit / rollback
+    ensure_export_schema(conn)
+    return record_slot(conn, write_slot_files(conn, slot_id, filter_type, filter_values, export_dir, compress))
+
+
+def refresh_slots(conn, export_dir=EXPORT_DIR, compress=True, record=None):
+    # 按各槽位记录的筛选条件重算内容哈希, 只重建有变化 (或文件丢失) 的槽位
+    # record(written): 落库回调, 默认在 conn 上执行; dashboard 用只读连接重建, 只在回调里短暂拿写锁
+    ensure_export_schema(conn)
+    record = record or (lambda written: record_slot(conn, written))
+    report = []
+    manifests = conn.execute("SELECT slot_id, filter_type, filter_values, content_hash FROM slot_manifests ORDER BY slot_id").fetchall()
+    for slot_id, filter_type, filter_values, content_hash in manifests:
+        values = json.loads(filter_values or "[]")
+        current = compute_slot_hash(conn, filter_type, values)
+        if current == content_hash and os.path.exists(os.path.join(export_dir, slot_filename(slot_id))):
+            report.append({"slot_id": slot_id, "action": "skipped"})
+            continue
+        result = record(write_slot_files(conn, slot_id, filter_type, values, export_dir, compress))
+        result.update({"slot_id": slot_id, "action": "rebuilt"})
+        report.append(result)
+    return report
+
+
+def file_etag(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def merge_bundle_item(existing, item):
+    # 与阅读器原来的客户端去重规则一致: 标签取并集, 缺失的字段用后来者补齐
+    existing['tags'] = list(dict.fromkeys(existing.get('tags', []) + (item.get('tags') or [])))
+    for key in ('level', 'context', 'phonetic', 'en_term'):
+        existing[key] = existing.get(key) or item.get(key)
+    existing['sources'].append(item['sources'][0])
+
+
+def write_atomic(path, text, compress):
+    data = text.encode('utf-8')
+    targets = [(path, None)]
+    if compress:
+        targets += [(path + ext, encoding) for encoding, ext in COMPRESSED_VARIANTS]
+    for target, encoding in targets:
+        w = open_writer(target + ".tmp", encoding)
+        w.write(data)
+        w.close()
+    for target, encoding in targets:
+        os.replace(target + ".tmp", target)
+    if not compress:
+        remove_compressed_copies(path)
+
+
+def build_bundle(export_dir=EXPORT_DIR, compress=True):
+    # 合并目录下所有 NN.json 槽位文件 -> bundle.json + manifest.json; 只依赖文件本身, 也可用于 vocab_data
+    slots = {}
+    merged = {}
+    for name in sorted(os.listdir(export_dir)):
+        match = SLOT_FILE_RE.match(name)
+        if not match: continue
+        path = os.path.join(export_dir, name)
+        with open(path, 'r', encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except ValueError:
+                data = None
+        if not isinstance(data, list):
+            slots[match.group(1)] = {"file": name, "status": "error", "count": 0}
+            continue
+        slots[match.group(1)] = {"file": name, "status": "ok", "count": len(data), "etag": file_etag(path)}
+        for item in data:
+            if not item.get('es_term'): continue
+            item = dict(item, sources=[name])
+            key = item['es_term'].lower()
+            if key in merged: merge_bundle_item(merged[key], item)
+            else: merged[key] = item
+
+    # bundle 的 ETag 由各槽位 ETag 决定, 槽位文件不变则 bundle URL 不变, 可长期缓存
+    bundle_etag = hashlib.blake2b(json.dumps(slots, sort_keys=True).encode('utf-8'), digest_size=16).hexdigest()
+    items = [json.dumps(item, ensure_ascii=False, separators=(',', ':')) for item in merged.values()]
+    write_atomic(os.path.join(export_dir, BUNDLE_FILE), "[\n" + ",\n".join(items) + "\n]", compress)
+    manifest = {
+        "bundle": {"file": BUNDLE_FILE, "etag": bundle_etag, "count": len(items)},
+        "slots": slots,
+    }
+    write_atomic(os.path.join(export_dir, MANIFEST_FILE), json.dumps(manifest, ensure_ascii=False, indent=2), False)
+    return manifest
+
+
+def read_manifest(export_dir=EXPORT_DIR):
+    path = os.path.join(export_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def remove_compressed_copies(filepath):
+    for encoding, ext in [("br", ".br"), ("gzip", ".gz")]:
+        if os.path.exists(filepath + ext): os.remove(filepath + ext)
+
+
+def accepted_encodings(accept_encoding):
+    # 解析 Accept-Encoding 头 ("gzip;q=0.8, br, *;q=0"), 返回 q > 0 的编码集合;
+    # 显式 q=0 的编码即使被 "*" 覆盖也不算接受
+    accepted, refused, wildcard = set(), set(), False
+    for token in (accept_encoding or "").split(","):
+        name, _, params = token.partition(";")
+        name = name.strip().lower()
+        if not name: continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name == "*":
+            wildcard = q > 0
+        elif q > 0:
+            accepted.add(name)
+        else:
+            refused.add(name)
+    if wildcard:
+        accepted |= {encoding for encoding, ext in COMPRESSED_VARIANTS} - refused
+    return accepted
+
+
+def pick_encoded_file(export_dir, filename, accept_encoding):
+    # 返回 (磁盘文件名, Content-Encoding); 压缩副本必须不比原文件旧
+    plain = os.path.join(export_dir, filename)
+    if not os.path.exists(plain):
+        return filename, None
+    accepted = accepted_encodings(accept_encoding)
+    for encoding, ext in COMPRESSED_VARIANTS:
+        path = plain + ext
+        if encoding in accepted and os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(plain):
+            return filename + ext, encoding
+    return filename, None
+
+
+def publish_slots(source_dir=EXPORT_DIR, target_dir=PUBLISH_DIR, compress=False):
+    # 把导出的 NN.json 复制到阅读器目录并重建那里的 bundle / manifest; 只复制文件会让阅读器继续用旧 bundle
+    # 阅读器目录是静态托管, 用不上预压缩副本, 默认不生成
+    copied = []
+    for name in sorted(os.listdir(source_dir)):
+        if not SLOT_FILE_RE.match(name): continue
+        shutil.copyfile(os.path.join(source_dir, name), os.path.join(target_dir, name))
+        copied.append(name)
+    return copied, build_bundle(target_dir, compress)
+
+
+def stale_slots(export_dir=EXPORT_DIR):
+    # manifest 与目录里的槽位文件不一致的文件名 (新增/删除/内容变化); 没有 manifest 时返回 None
+    manifest = read_manifest(export_dir)
+    if manifest is None: return None
+    listed = {s["file"]: s.get("etag") for s in manifest.get("slots", {}).values()}
+    present = {name for name in os.listdir(export_dir) if SLOT_FILE_RE.match(name)}
+    stale = sorted((set(listed) ^ present) | {n for n in present & set(listed) if listed[n] and listed[n] != file_etag(os.path.join(export_dir, n))})
+    return stale
+
+
+if __name__ == '__main__':
+    # 用法: python vocab_export.py bundle [目录] [--no-compress]   (例如给 ../vocab_data 重建 bundle)
+    #       python vocab_export.py publish [源目录] [目标目录] [--compress]   (exported_slots -> ../vocab_data 并重建 bundle)
+    #       python vocab_export.py check [目录]   (manifest 过期时退出码为 1, 可放进提交前检查)
+    usage = "用法: python vocab_export.py bundle [目录] [--no-compress] | publish [源目录] [目标目录] [--compress] | check [目录]"
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    compress = '--no-compress' not in sys.argv
+    if not args or args[0] not in ('bundle', 'publish', 'check'):
+        print(usage)
+        sys.exit(1)
+    if args[0] == 'bundle':
+        target = args[1] if len(args) > 1 else EXPORT_DIR
+        result = build_bundle(target, compress=compress)
+    elif args[0] == 'publish':
+        source = args[1] if len(args) > 1 else EXPORT_DIR
+        target = args[2] if len(args) > 2 else PUBLISH_DIR
+        copied, result = publish_slots(source, target, '--compress' in sys.argv)
+        print(f"🚚 {source} -> {target}: 复制 {len(copied)} 个槽位文件")
+        stale = stale_slots(target)
+        if stale:
+            print(f"❌ {target}: 发布后 manifest 仍与槽位文件不一致: {', '.join(stale)}")
+            sys.exit(1)
+    else:
+        target = args[1] if len(args) > 1 else PUBLISH_DIR
+        stale = stale_slots(target)
+        if stale is None or stale:
+            print(f"❌ {target}: manifest/bundle 已过期 ({'缺少 manifest' if stale is None else ', '.join(stale)}), 请运行 python vocab_export.py bundle {target}")
+            sys.exit(1)
+        print(f"✅ {target}: manifest 与槽位文件一致")
+        sys.exit(0)
+    print(f"📦 {target}: {len(result['slots'])} 个槽位 -> {result['bundle']['count']} 词 (ETag {result['bundle']['etag']})")
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import random
+import re
+import zlib
+
+from vocab_prompts import TAG_IDS
+
+# ================= 本地假模型后端 =================
+# 与 vocab_worker.GeminiClient 接口一致, 不走网络、不花钱。
+# 用法: asyncio.run(vocab_worker.run_worker(FakeModelClient, stop_when_idle=True))
+
+FAKE_TAGS = ["office", "finance", "legal", "it", "transport", "energy", "comm", "abstract"]
+
+
+class FakeUsage:
+    # 与 Gemini 响应的 usage_metadata 字段同名; token 数按字符粗估, 只用于比较模板之间的相对大小
+    def __init__(self, prompt, text):
+        self.prompt_token_count = count_tokens(prompt)
+        self.candidates_token_count = count_tokens(text)
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeModelClient:
+    # latency: 正常响应的均匀分布区间; tail_rate 的请求改为 tail_latency~2*tail_latency 秒 (长尾)
+    # rate_429: 抛出 429; malformed_rate: 返回被截断的 JSON; drop_rate: 每个词被模型"漏掉"的概率
+    def __init__(self, model_name, latency=(0.05, 0.3), rate_429=0.0, seed=None,
+                 tail_rate=0.0, tail_latency=2.0, malformed_rate=0.0, drop_rate=0.0):
+        self.model_name = model_name
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.malformed_rate = malformed_rate
+        self.drop_rate = drop_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.latencies = []       # 每次调用的模拟耗时 (秒)
+        self.seen = []            # [(任务类型, word)], 压测时用来检查是否有重复处理
+
+    def sample_latency(self):
+        if self.rng.random() < self.tail_rate:
+            return self.rng.uniform(self.tail_latency, self.tail_latency * 2)
+        return self.rng.uniform(*self.latency)
+
+    async def generate(self, prompt):
+        self.calls += 1
+        delay = self.sample_latency()
+        self.latencies.append(delay)
+        await asyncio.sleep(delay)
+        if self.rng.random() < self.rate_429:
+            raise Exception("429 Resource has been exhausted (fake). Please retry in 1s.")
+        words = parse_prompt_words(prompt)
+        # 只看指令部分判断任务, 避免释义提示里恰好出现 "definition" 之类的词造成误判
+        instructions = re.sub(r'Rows \(word\|hint\):\n.*?\nOutput JSON', 'Output JSON', re.sub(r'Input: .*', '', prompt), flags=re.S)
+        wants_tags = "Tags:" in instructions
+        wants_translation = "definition" in instructions or '"d":' in instructions
+        compact = "Rows (word|hint):" in prompt
+        kind = "fused" if wants_tags and wants_translation else ("classify" if wants_tags else "translate")
+        self.seen.extend((kind, w) for w in words)
+        payload = []
+        for w in words:
+            if self.rng.random() < self.drop_rate: continue
+            item = fake_translation(w) if wants_translation else {"word": w}
+            if wants_tags: item["tags"] = fake_tags(w)
+            payload.append(compact_item(item) if compact else item)
+        text = json.dumps(payload, ensure_ascii=False)
+        if payload and self.rng.random() < self.malformed_rate:
+            # 模拟输出被截断: 在随机位置切断, 包一层 markdown 代码块
+            text = "```json\n" + text[:self.rng.randint(1, len(text) - 1)]
+        return FakeResponse(text, FakeUsage(prompt, text))
+
+
+def parse_prompt_words(prompt):
+    rows = re.search(r'Rows \(word\|hint\):\n(.*?)\nOutput JSON', prompt, re.S)
+    if rows:
+        # 紧凑模板: 每行 "word|hint"
+        return [line.split("|", 1)[0] for line in rows.group(1).splitlines() if line]
+    match = re.search(r'Input: (.*)', prompt)
+    if not match: return []
+    items = json.loads(match.group(1))
+    words = []
+    for item in items:
+        if isinstance(item, dict):
+            words.append(item["word"])
+        else:
+            words.append(item.rsplit(" (Def: ", 1)[0])
+    return words
+
+
+def fake_tags(word):
+    # 按词做稳定哈希, 同一个词每次得到同样的标签, 便于对比多次运行结果
+    h = zlib.crc32(word.encode('utf-8'))
+    return [FAKE_TAGS[h % len(FAKE_TAGS)]] if h % 3 else []
+
+
+def fake_translation(word):
+    return {"word": word, "definition": f"释义:{word}", "phonetic": f"/{word}/", "context": f"Uso de {word}."}
+
+
+def compact_item(item):
+    # 按紧凑模板的短字段名作答: t 为标签编号, d/p/c 为释义/音标/例句
+    out = {"word": item["word"]}
+    if "tags" in item: out["t"] = [TAG_IDS.index(t) + 1 for t in item["tags"]]
+    for short, full in (("d", "definition"), ("p", "phonetic"), ("c", "context")):
+        if full in item: out[short] = item[full]
+    return out
+
+
+def count_tokens(text):
+    # 粗估: ASCII 约 4 字符 1 token, 其他字符 (中文、IPA) 约 1 字符 1 token
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return max(1, ascii_chars // 4 + (len(text) - ascii_chars))
@@ -0,0 +1,106 @@
+import hashlib
+import time
+import unicodedata
+
+# ================= 词形聚类 (派发前去重) =================
+# 只差大小写/重音 (rápido/rapido)、单复数 (causa/causas)、阴阳性 (cansado/cansada) 的词条, 分类结果相同。
+# cluster_key = 归一化词干 + 释义提示的哈希: 只有释义提示 (义项集合) 也完全相同才算同一簇,
+# 避免把 sonar/sónar、ala/alá 这类只是拼写相近的不同词并在一起。ñ 不折叠 (cuna ≠ cuña)。
+# 每簇只把代表词 (最短, 同长取字典序最小) 发给模型分类, 结果按各兄弟词自己的级别扇出。
+# 翻译不去重: 音标和例句与具体词形相关, 兄弟词仍各自走翻译阶段。
+
+LEMMA_MIN_LENGTH = 5        # 去后缀前词长至少为此值, 避免 "mes" -> "m" 这种误伤
+NUMBER_SUFFIXES = (("ces", "z"), ("es", ""), ("s", ""))
+GENDER_SUFFIXES = (("ora", "or"), ("ona", "on"), ("esa", "es"), ("a", "o"))
+
+# 领取条件: 代表词, 或者代表词已经不在待分类状态 (例如兄弟词被单独重置)
+REP_READY = """(cluster_rep IS NULL OR cluster_rep = word OR NOT EXISTS (
+    SELECT 1 FROM vocab_staging r WHERE r.word = vocab_staging.cluster_rep AND r.processed_flag = 0))"""
+
+
+def fold_word(word):
+    # 小写 + 去重音, 保留 ñ
+    word = word.strip().lower().replace("ñ", "\0")
+    word = "".join(c for c in unicodedata.normalize("NFD", word) if unicodedata.category(c) != "Mn")
+    return word.replace("\0", "ñ")
+
+
+def strip_suffix(word, suffixes):
+    for suffix, replacement in suffixes:
+        if word.endswith(suffix) and len(word) >= LEMMA_MIN_LENGTH:
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def lemma_key(word):
+    folded = fold_word(word)
+    if " " in folded: return folded   # 短语不做词形还原
+    return strip_suffix(strip_suffix(folded, NUMBER_SUFFIXES), GENDER_SUFFIXES)
+
+
+def hint_key(hint):
+    senses = sorted({s.strip().lower() for s in (hint or "").split(",") if s.strip()})
+    return ", ".join(senses)
+
+
+def cluster_key(word, hint):
+    digest = hashlib.blake2b(hint_key(hint).encode("utf-8"), digest_size=6).hexdigest()
+    return f"{lemma_key(word)}#{digest}"
+
+
+def pick_rep(words):
+    return min(words, key=lambda w: (len(w), w))
+
+
+def ensure_cluster_schema(conn):
+    # 列由 init_db 添加; 这里补索引并回填旧库里还没有 cluster_key 的行
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_staging_cluster ON vocab_staging (cluster_key)")
+    missing = conn.execute("SELECT word, hint FROM vocab_staging WHERE cluster_key IS NULL").fetchall()
+    if missing:
+        conn.executemany("UPDATE vocab_staging SET cluster_key = ? WHERE word = ?", [(cluster_key(w, h), w) for w, h in missing])
+        refresh_cluster_reps(conn)
+    conn.commit()
+
+
+def refresh_cluster_reps(conn):
+    # 导入有新增/变更后重算每簇代表词; 只改写变化的行
+    clusters = {}
+    current = {}
+    for word, key, rep in conn.execute("SELECT word, cluster_key, cluster_rep FROM vocab_staging"):
+        clusters.setdefault(key, []).append(word)
+        current[word] = rep
+    updates = []
+    for key, words in clusters.items():
+        rep = pick_rep(words)
+        updates.extend((rep, w) for w in words if current[w] != rep)
+    conn.executemany("UPDATE vocab_staging SET cluster_rep = ? WHERE word = ?", updates)
+    return len(updates)
+
+
+def find_siblings(cursor, reps):
+    # 返回 [(代表词, 兄弟词, 兄弟词级别, 兄弟词释义提示)]: 同簇、仍待分类、没有被其他 worker 持有租约
+    if not reps: return []
+    placeholders = ",".join("?" * len(reps))
+    return cursor.execute(f"""
+        SELECT r.word, s.word, s.level, s.hint FROM vocab_staging r
+        JOIN vocab_staging s ON s.cluster_key = r.cluster_key AND s.word != r.word
+        WHERE r.word IN ({placeholders}) AND s.processed_flag = 0 AND (s.lease_owner IS NULL OR s.lease_expires < ?)
+    """, list(reps) + [time.time()]).fetchall()
+
+
+def dedup_report(conn, examples=10):
+    # 按去重层级统计可省下的分类调用词数: 只折叠大小写/重音, 再加单复数/阴阳性
+    rows = conn.execute("SELECT word, hint, cluster_key FROM vocab_staging").fetchall()
+    folded = {(fold_word(w), hint_key(h)) for w, h, k in rows}
+    clusters = {}
+    for w, h, k in rows:
+        clusters.setdefault(k, []).append(w)
+    multi = sorted((ws for ws in clusters.values() if len(ws) > 1), key=len, reverse=True)
+    return {
+        "words": len(rows),
+        "clusters": len(clusters),
+        "saved_case_accent": len(rows) - len(folded),
+        "saved_total": len(rows) - len(clusters),
+        "saved_ratio": round((len(rows) - len(clusters)) / len(rows), 4) if rows else 0,
+        "examples": [sorted(ws, key=lambda w: (len(w), w)) for ws in multi[:examples]],
+    }
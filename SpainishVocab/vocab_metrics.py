@@ -0,0 +1,218 @@
+import bisect
+import json
+import math
+import threading
+import time
+
+# ================= 运行指标 (Prometheus 风格) =================
+# worker 进程内累计计数器 / 直方图 / 瞬时值, 定期把快照写进共享库的 worker_metrics 表;
+# dashboard 读取所有 worker 的快照, 以 /metrics (文本格式) 和 /api/metrics (图表用 JSON) 输出。
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+METRICS_RETENTION = 86400      # 超过一天没更新的 worker 快照在发布时清理
+
+HELP = {
+    "vocab_llm_requests_total": ("counter", "模型调用次数, 按结果 (ok/throttled/error) 区分"),
+    "vocab_llm_retries_total": ("counter", "重试次数 (含 429)"),
+    "vocab_llm_latency_seconds": ("histogram", "单次 generate 调用耗时"),
+    "vocab_llm_tokens_total": ("counter", "模型 token 用量, 按模板版本和 kind (prompt/output) 区分"),
+    "vocab_words_total": ("counter", "处理的单词数, 按结果 (ok/missing/cached/sibling) 区分; sibling 为同簇扇出, 未调用模型"),
+    "vocab_db_commit_seconds": ("histogram", "落库 + commit 耗时 (每组一次)"),
+    "vocab_db_group_size": ("histogram", "每次提交合并的 chunk 数"),
+    "vocab_concurrency_limit": ("gauge", "AIMD 当前并发上限"),
+    "vocab_in_flight": ("gauge", "在途请求数"),
+    "vocab_batch_size": ("gauge", "当前自适应批大小"),
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # 最后一格是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        return {"buckets": list(self.buckets), "counts": self.counts, "sum": self.sum, "count": self.count}
+
+
+class MetricsRegistry:
+    # 事件循环和写库线程都会记录指标, 所有读写都在锁内进行
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def reset(self):
+        self.__init__()
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def snapshot(self):
+        def rows(store, convert=lambda v: v):
+            return [{"name": name, "labels": dict(labels), "value": convert(v)} for (name, labels), v in store.items()]
+        with self.lock:
+            return {
+                "started": self.started,
+                "counters": rows(self.counters),
+                "gauges": rows(self.gauges),
+                "histograms": rows(self.histograms, lambda h: h.to_dict()),
+            }
+
+
+METRICS = MetricsRegistry()
+
+
+# ================= 共享存储 =================
+def ensure_metrics_schema(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS worker_metrics (worker_id TEXT PRIMARY KEY, updated_at REAL, data TEXT)")
+
+
+def publish_metrics(conn, worker_id, registry=METRICS):
+    # 由调用方 commit (worker 循环里和落库共用一次提交)
+    now = time.time()
+    conn.execute("INSERT OR REPLACE INTO worker_metrics (worker_id, updated_at, data) VALUES (?, ?, ?)",
+                 (worker_id, now, json.dumps(registry.snapshot())))
+    conn.execute("DELETE FROM worker_metrics WHERE updated_at < ?", (now - METRICS_RETENTION,))
+
+
+def load_snapshots(conn):
+    try:
+        rows = conn.execute("SELECT worker_id, updated_at, data FROM worker_metrics ORDER BY worker_id").fetchall()
+    except Exception:
+        return []   # worker 还没以新版本启动过
+    return [(worker_id, updated_at, json.loads(data)) for worker_id, updated_at, data in rows]
+
+
+# ================= 输出格式 =================
+def _format_labels(labels):
+    if not labels: return ""
+    inner = ",".join(f'{k}="{str(v)}"' for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+
+def render_prometheus(snapshots):
+    # 每个 worker 的序列都带 worker 标签, 进程重启换了 ID 也不会造成计数回退
+    lines = []
+    series = {}
+    for worker_id, updated_at, snap in snapshots:
+        for kind in ("counters", "gauges", "histograms"):
+            for row in snap.get(kind, []):
+                series.setdefault(row["name"], []).append((dict(row["labels"], worker=worker_id), row["value"]))
+    for name in sorted(series):
+        kind, help_text = HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series[name]:
+            if kind != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(value["buckets"] + [math.inf], value["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(dict(labels, le=_format_bound(bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {value['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def histogram_quantile(q, buckets, counts):
+    # 与 Prometheus 的 histogram_quantile 相同: 在命中的桶内线性插值
+    total = sum(counts)
+    if not total: return None
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(list(buckets) + [math.inf], counts):
+        if cumulative + count >= rank:
+            if bound == math.inf: return lower
+            return lower + (bound - lower) * ((rank - cumulative) / count if count else 0)
+        cumulative += count
+        lower = bound
+    return lower
+
+
+def summarize(snapshots, label_keys=("task", "model")):
+    # 合并所有 worker, 按 (task, model) 汇总成图表数据
+    groups = {}
+
+    def group(labels):
+        key = tuple(labels.get(k, "") for k in label_keys)
+        return groups.setdefault(key, {"requests": {}, "retries": 0, "words": {}, "buckets": None, "counts": None, "latency_sum": 0.0})
+
+    db = {"buckets": None, "counts": None, "sum": 0.0, "count": 0}
+    for worker_id, updated_at, snap in snapshots:
+        for row in snap.get("counters", []):
+            labels = row["labels"]
+            if row["name"] == "vocab_llm_requests_total":
+                g = group(labels)
+                g["requests"][labels.get("outcome")] = g["requests"].get(labels.get("outcome"), 0) + row["value"]
+            elif row["name"] == "vocab_llm_retries_total":
+                group(labels)["retries"] += row["value"]
+            elif row["name"] == "vocab_words_total":
+                g = group(labels)
+                g["words"][labels.get("result")] = g["words"].get(labels.get("result"), 0) + row["value"]
+        for row in snap.get("histograms", []):
+            h = row["value"]
+            target = group(row["labels"]) if row["name"] == "vocab_llm_latency_seconds" else db if row["name"] == "vocab_db_commit_seconds" else None
+            if target is None: continue
+            if target["counts"] is None:
+                target["buckets"], target["counts"] = h["buckets"], [0] * len(h["counts"])
+            target["counts"] = [a + b for a, b in zip(target["counts"], h["counts"])]
+            if target is db:
+                db["sum"] += h["sum"]; db["count"] += h["count"]
+            else:
+                target["latency_sum"] += h["sum"]
+
+    stages = []
+    for key, g in sorted(groups.items()):
+        total = sum(g["requests"].values())
+        entry = dict(zip(label_keys, key))
+        entry.update({
+            "requests": total,
+            "throttle_rate": round(g["requests"].get("throttled", 0) / total, 4) if total else 0,
+            "retries": g["retries"],
+            "words": g["words"],
+        })
+        if g["counts"]:
+            entry["p50"] = histogram_quantile(0.5, g["buckets"], g["counts"])
+            entry["p99"] = histogram_quantile(0.99, g["buckets"], g["counts"])
+            entry["avg"] = g["latency_sum"] / max(1, sum(g["counts"]))
+        stages.append(entry)
+
+    db_summary = {"count": db["count"], "avg": db["sum"] / db["count"] if db["count"] else None}
+    if db["counts"]:
+        db_summary["p50"] = histogram_quantile(0.5, db["buckets"], db["counts"])
+        db_summary["p99"] = histogram_quantile(0.99, db["buckets"], db["counts"])
+    return {"stages": stages, "db_commit": db_summary, "workers": [
+        {"worker_id": w, "updated_at": u, "started": s.get("started")} for w, u, s in snapshots]}
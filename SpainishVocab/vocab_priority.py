@@ -0,0 +1,87 @@
+import json
+
+# ================= 优先级调度 =================
+# dashboard 把优先级提示写进 app_config 'priority_hints' (JSON 列表, 越靠前越优先):
+#   {"type": "level", "values": ["A1", "A2", "B1"]}
+#   {"type": "tag", "values": ["legal"]}
+#   {"type": "slot", "slot_id": 3}   -> 按该槽位保存的导出筛选条件展开成 level/tag 提示
+# worker 把命中的词的 priority 列设为 (提示总数 - 序号), 领取时按 priority 降序。
+# 标签只有分类后才知道: tag 提示只能提前这些词的翻译, 所以 worker 会定期补一次 (新分类出的词)。
+
+PRIORITY_TYPES = ("level", "tag")
+PRIORITY_REFRESH_SECONDS = 30    # 定期把新分类出、命中 tag 提示的词补上优先级
+
+
+def ensure_priority_schema(conn):
+    # priority 列由 init_db 添加; 两个阶段的领取都能直接按索引顺序取最高优先级的行
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_staging_claim_classify ON vocab_staging (processed_flag, priority DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_staging_claim_translate ON vocab_staging (status, translated_flag, priority DESC)")
+    conn.commit()
+
+
+def normalize_hints(conn, hints):
+    # 校验并展开 slot 提示; 无效的提示直接丢弃
+    normalized = []
+    for hint in hints or []:
+        if not isinstance(hint, dict): continue
+        label = hint.get("label")
+        if hint.get("type") == "slot":
+            slot_id = hint.get("slot_id")
+            row = conn.execute("SELECT filter_type, filter_values FROM slot_manifests WHERE slot_id = ?", (slot_id,)).fetchone()
+            if row is None: continue
+            hint = {"type": row[0], "values": json.loads(row[1] or "[]")}
+            label = label or f"slot {int(slot_id):02d}"
+        values = [v for v in hint.get("values", []) if isinstance(v, str)]
+        if hint.get("type") not in PRIORITY_TYPES or not values: continue
+        normalized.append({"type": hint["type"], "values": values, "label": label or f"{hint['type']}: {', '.join(values)}"})
+    return normalized
+
+
+def load_hints(raw):
+    try:
+        hints = json.loads(raw) if raw else []
+    except ValueError:
+        return []
+    return hints if isinstance(hints, list) else []
+
+
+def hint_clause(hint):
+    placeholders = ",".join("?" * len(hint["values"]))
+    if hint["type"] == "level":
+        return f"level IN ({placeholders})", list(hint["values"])
+    return f"word IN (SELECT word FROM word_tags WHERE tag IN ({placeholders}))", list(hint["values"])
+
+
+def apply_priority_hints(conn, hints, reset=True):
+    # reset: 提示变化时先清零再重算; 否则只把新命中的词往上调 (定期补 tag 提示)
+    # 已翻译完的词不再需要调度, 不改它们 (减少无谓写入)
+    if reset:
+        conn.execute("UPDATE vocab_staging SET priority = 0 WHERE priority != 0")
+    raised = 0
+    for i, hint in enumerate(hints):
+        priority = len(hints) - i
+        clause, params = hint_clause(hint)
+        raised += conn.execute(f"""UPDATE vocab_staging SET priority = ?
+                                   WHERE {clause} AND priority < ? AND (processed_flag != 1 OR (status = 'keep' AND translated_flag != 1))""",
+                               [priority] + params + [priority]).rowcount
+        # 同簇去重时兄弟词要等代表词分类完, 代表词也一起提前
+        raised += conn.execute(f"""UPDATE vocab_staging SET priority = ?
+                                   WHERE word IN (SELECT cluster_rep FROM vocab_staging WHERE {clause} AND processed_flag = 0)
+                                   AND priority < ? AND processed_flag = 0""",
+                               [priority] + params + [priority]).rowcount
+    return raised
+
+
+def priority_progress(conn, hints):
+    # 每个提示的完成情况: 待分类 / 待翻译 / 已完成 (tag 提示的待分类数未知, 分类后才知道标签)
+    progress = []
+    for hint in hints:
+        clause, params = hint_clause(hint)
+        total, unclassified, untranslated, done = conn.execute(f"""
+            SELECT count(*), coalesce(sum(processed_flag = 0), 0),
+                   coalesce(sum(status = 'keep' AND translated_flag = 0), 0),
+                   coalesce(sum(status = 'keep' AND translated_flag = 1), 0)
+            FROM vocab_staging WHERE {clause}""", params).fetchone()
+        progress.append(dict(hint, matched=total, pending_classify=unclassified if hint["type"] == "level" else None,
+                             pending_translate=untranslated, translated=done))
+    return progress
@@ -0,0 +1,229 @@
+import json
+import zlib
+
+# ================= Prompt 模板 (带版本) =================
+# 每个任务可以有多个模板版本: (build(rows) -> prompt, decode(items) -> 标准结果)。
+# 标准结果: {"word", "tags": [标签名]} / {"word", "definition", "phonetic", "context"}。
+# v1 是原始的 JSON 输入格式; v2 是紧凑格式: 标签用编号图例、输入按 "word|hint" 一行一个、过长的 hint 截断。
+# 修改任一模板都要新增版本号, 缓存键里带版本, 旧缓存自动失效。
+
+TAG_LIST_STR = """
+[Professional Tags]
+office, hr, finance, legal, it, ops, marketing, bd, procurement, qhse,
+pm, bidding, supervision, water, transport, rail, roads, airport, ports, energy, urban, geo, environment
+
+[General Categories]
+comm (communication), abstract (logic/time/numbers), society (politics/history)
+"""
+
+# 编号从 1 开始, 只能在末尾追加, 否则旧的 v2 缓存里的编号会对不上
+TAG_IDS = ["office", "hr", "finance", "legal", "it", "ops", "marketing", "bd", "procurement", "qhse",
+           "pm", "bidding", "supervision", "water", "transport", "rail", "roads", "airport", "ports", "energy",
+           "urban", "geo", "environment", "comm", "abstract", "society"]
+TAG_LEGEND = " ".join(f"{i}={t}" for i, t in enumerate(TAG_IDS, 1))
+HINT_MAX_CHARS = 32         # v2 里 hint 超过该长度时只保留前几个义项
+
+# v2 的标签图例去掉了 v1 里的类别说明, 分类质量只在假后端上验证过; 用真实模型 A/B 之前默认仍用 v1
+# (dashboard 的 prompt_versions 可以按任务切到 v2 或做 A/B)
+DEFAULT_PROMPT_VERSIONS = {"Classify": "v1", "Translate": "v1", "Fused": "v1"}
+
+
+def truncate_hint(hint, limit=HINT_MAX_CHARS):
+    # 按逗号分隔的义项截断, 至少保留第一个义项
+    hint = (hint or "").strip()
+    if len(hint) <= limit: return hint
+    kept = []
+    for sense in hint.split(","):
+        sense = sense.strip()
+        if kept and len(", ".join(kept + [sense])) > limit: break
+        kept.append(sense)
+    return ", ".join(kept)[:limit]
+
+
+def format_rows(rows):
+    return "\n".join(f"{w}|{truncate_hint(h).replace('|', '/')}" for w, l, h in rows)
+
+
+def decode_tags(values):
+    # 模型输出不可信: 单个值按一元列表处理; 只接受合法编号或 TAG_IDS 里的标签名, 其他丢弃
+    if values is None: return []
+    if not isinstance(values, list): values = [values]
+    tags = []
+    for v in values:
+        if isinstance(v, bool): continue
+        if isinstance(v, str) and v.strip().isdigit(): v = int(v.strip())
+        if isinstance(v, int) and 1 <= v <= len(TAG_IDS): tags.append(TAG_IDS[v - 1])
+        elif isinstance(v, str) and v.strip().lower() in TAG_IDS: tags.append(v.strip().lower())   # 模型偶尔直接返回标签名
+    return tags
+
+
+# ---------- v1: 原始格式 ----------
+def build_classify_v1(rows):
+    input_list = [f"{w} (Def: {h})" for w, l, h in rows]
+    return f"""
+    Role: Spanish linguistic expert.
+    Tags: {TAG_LIST_STR}
+    Task: Classify words. Return empty tags [] if no fit.
+    Input: {json.dumps(input_list)}
+    Output JSON: [{{"word": "word1", "tags": ["tag1"]}}]
+    """
+
+def build_translate_v1(rows):
+    input_list = [{"word": w, "hint": h} for w, _, h in rows]
+    return f"""
+    Role: Expert Spanish-Chinese Translator.
+    Task: Provide Chinese definition, IPA phonetic, and a simple Spanish context sentence for each word.
+    Input: {json.dumps(input_list)}
+    Output JSON Format:
+    [
+      {{"word": "ordenador", "definition": "电脑", "phonetic": "/oɾ.ðe.naˈðoɾ/", "context": "Mi ordenador es nuevo."}}
+    ]
+    """
+
+def build_fused_v1(rows):
+    input_list = [{"word": w, "hint": h} for w, _, h in rows]
+    return f"""
+    Role: Spanish linguistic expert and Spanish-Chinese translator.
+    Tags: {TAG_LIST_STR}
+    Task: For each word, classify it (empty tags [] if no fit) and provide Chinese definition, IPA phonetic, and a simple Spanish context sentence.
+    Input: {json.dumps(input_list)}
+    Output JSON Format:
+    [
+      {{"word": "ordenador", "tags": ["it"], "definition": "电脑", "phonetic": "/oɾ.ðe.naˈðoɾ/", "context": "Mi ordenador es nuevo."}}
+    ]
+    """
+
+def clean_text(value):
+    # 释义/音标/例句只接受字符串 (数字转成字符串), dict/list 等无法落库的值返回 None
+    if isinstance(value, (int, float)) and not isinstance(value, bool): return str(value)
+    return value if isinstance(value, str) else None
+
+
+def decode_v1(items):
+    # 与 v2 同样的类型检查: 标签必须是列表里的合法标签名, 文本字段必须是字符串
+    out = []
+    for i in items:
+        item = {"word": i["word"]}
+        if "tags" in i: item["tags"] = decode_tags(i["tags"])
+        for key in ("definition", "phonetic", "context"):
+            value = clean_text(i.get(key))
+            if value is not None: item[key] = value
+        out.append(item)
+    return out
+
+
+# ---------- v2: 紧凑格式 ----------
+def build_classify_v2(rows):
+    return f"""Classify each Spanish word with tag IDs ([] if none fit).
+Tags: {TAG_LEGEND}
+Rows (word|hint):
+{format_rows(rows)}
+Output JSON: [{{"word":"ordenador","t":[5]}}]"""
+
+def build_translate_v2(rows):
+    return f"""For each Spanish word give Chinese definition d, IPA p, short Spanish example c.
+Rows (word|hint):
+{format_rows(rows)}
+Output JSON: [{{"word":"ordenador","d":"电脑","p":"/oɾ.ðe.naˈðoɾ/","c":"Mi ordenador es nuevo."}}]"""
+
+def build_fused_v2(rows):
+    return f"""For each Spanish word: tag IDs t ([] if none fit), Chinese definition d, IPA p, short Spanish example c.
+Tags: {TAG_LEGEND}
+Rows (word|hint):
+{format_rows(rows)}
+Output JSON: [{{"word":"ordenador","t":[5],"d":"电脑","p":"/oɾ.ðe.naˈðoɾ/","c":"Mi ordenador es nuevo."}}]"""
+
+def decode_v2(items):
+    out = []
+    for i in items:
+        item = {"word": i["word"]}
+        if "t" in i or "tags" in i: item["tags"] = decode_tags(i.get("t", i.get("tags")))
+        for short, full in (("d", "definition"), ("p", "phonetic"), ("c", "context")):
+            value = clean_text(i.get(short, i.get(full)))
+            if value is not None: item[full] = value   # dict/list 等无法落库的值直接丢弃
+        out.append(item)
+    return out
+
+
+PROMPT_TEMPLATES = {
+    "Classify": {"v1": (build_classify_v1, decode_v1), "v2": (build_classify_v2, decode_v2)},
+    "Translate": {"v1": (build_translate_v1, decode_v1), "v2": (build_translate_v2, decode_v2)},
+    "Fused": {"v1": (build_fused_v1, decode_v1), "v2": (build_fused_v2, decode_v2)},
+}
+
+
+def pick_version(task_type, overrides, rows):
+    # overrides 来自 app_config 'prompt_versions': {"Classify": "v1"} 或做 A/B 的 {"Classify": ["v1", "v2"]}
+    # A/B 时按 chunk 首词的哈希分组, 同一个 chunk 重试时仍落在同一组
+    choice = (overrides or {}).get(task_type, DEFAULT_PROMPT_VERSIONS[task_type])
+    if isinstance(choice, list):
+        choice = [v for v in choice if v in PROMPT_TEMPLATES[task_type]]
+        if not choice: return DEFAULT_PROMPT_VERSIONS[task_type]
+        return choice[zlib.crc32(rows[0][0].encode('utf-8')) % len(choice)] if rows else choice[0]
+    return choice if choice in PROMPT_TEMPLATES[task_type] else DEFAULT_PROMPT_VERSIONS[task_type]
+
+
+# ================= Token 计量 =================
+def read_usage(response, prompt):
+    # 优先用响应里的 usage_metadata; 没有时按字符数粗估 (约 4 字符 1 token)
+    meta = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(meta, "prompt_token_count", None) if meta is not None else None
+    output_tokens = getattr(meta, "candidates_token_count", None) if meta is not None else None
+    if prompt_tokens is None: prompt_tokens = max(1, len(prompt) // 4)
+    if output_tokens is None: output_tokens = max(1, len(getattr(response, "text", "") or "") // 4)
+    return prompt_tokens, output_tokens
+
+
+class TokenTally:
+    # 一个 chunk 内所有调用的 token 合计; 每次调用的 token 平均摊到本次发送的词上 (重发的词会多摊)
+    def __init__(self, task_type, model_name, version):
+        self.task_type = task_type
+        self.model_name = model_name
+        self.version = version
+        self.calls = 0
+        self.prompt = 0
+        self.output = 0
+        self.words = {}
+
+    def add(self, rows, prompt_tokens, output_tokens):
+        self.calls += 1
+        self.prompt += prompt_tokens
+        self.output += output_tokens
+        share = len(rows) or 1
+        for w, l, h in rows:
+            p, o = self.words.get(w, (0.0, 0.0))
+            self.words[w] = (p + prompt_tokens / share, o + output_tokens / share)
+
+
+def ensure_usage_schema(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS token_usage (
+        task_type TEXT, model_name TEXT, template_version TEXT,
+        calls INTEGER DEFAULT 0, words INTEGER DEFAULT 0,
+        prompt_tokens INTEGER DEFAULT 0, output_tokens INTEGER DEFAULT 0,
+        PRIMARY KEY (task_type, model_name, template_version))''')
+
+
+def record_usage(cursor, tally, words_done):
+    # 在落库事务里执行: 累计到 token_usage 汇总表, 并把每个词分摊到的 token 加到 vocab_staging
+    if tally is None or not tally.calls: return
+    cursor.execute('''INSERT INTO token_usage (task_type, model_name, template_version, calls, words, prompt_tokens, output_tokens)
+                      VALUES (?, ?, ?, ?, ?, ?, ?)
+                      ON CONFLICT (task_type, model_name, template_version) DO UPDATE SET
+                          calls = calls + excluded.calls, words = words + excluded.words,
+                          prompt_tokens = prompt_tokens + excluded.prompt_tokens, output_tokens = output_tokens + excluded.output_tokens''',
+                   (tally.task_type, tally.model_name, tally.version, tally.calls, words_done, tally.prompt, tally.output))
+    cursor.executemany("UPDATE vocab_staging SET prompt_tokens = prompt_tokens + ?, output_tokens = output_tokens + ? WHERE word = ?",
+                       [(p, o, w) for w, (p, o) in tally.words.items()])
+
+
+def read_token_usage(conn):
+    try:
+        rows = conn.execute('''SELECT task_type, model_name, template_version, calls, words, prompt_tokens, output_tokens
+                               FROM token_usage ORDER BY task_type, model_name, template_version''').fetchall()
+    except Exception:
+        return []
+    return [{
+        "task": r[0], "model": r[1], "version": r[2], "calls": r[3], "words": r[4],
+        "prompt_tokens": r[5], "output_tokens": r[6],
+        "tokens_per_word": round((r[5] + r[6]) / r[4], 1) if r[4] else None,
+    } for r in rows]
@@ -0,0 +1,127 @@
+import asyncio
+import random
+import time
+
+# ================= 全局限流 (RPM / TPM 令牌桶) =================
+# 同一进程内所有并发请求共用每个模型的一组令牌桶。
+# 任何一个请求收到 429, 整个模型的派发都会暂停, 而不是只睡眠出错的那一个请求。
+
+# 每个模型的预算: 每分钟请求数 / 每分钟 token 数 (与 vocab_dashboard.AVAILABLE_MODELS 对应)
+# 可在 app_config 的 'rate_limits' 里按 {"model": {"rpm": .., "tpm": ..}} 覆盖
+MODEL_BUDGETS = {
+    "gemini-2.5-flash": {"rpm": 1000, "tpm": 1000000},
+    "gemini-2.0-flash-exp": {"rpm": 10, "tpm": 4000000},
+    "gemini-1.5-flash": {"rpm": 2000, "tpm": 4000000},
+    "gemini-1.5-pro": {"rpm": 1000, "tpm": 4000000},
+}
+DEFAULT_BUDGET = {"rpm": 300, "tpm": 1000000}
+BASE_BUDGETS = {model: dict(budget) for model, budget in MODEL_BUDGETS.items()}   # 覆盖前的默认值, 每次按它重建
+
+BACKOFF_BASE = 1.0     # 指数退避基数 (秒)
+BACKOFF_CAP = 60.0     # 单次退避上限 (秒)
+
+
+def estimate_tokens(prompt):
+    # 粗估: 约 4 个字符 1 个 token, 输出按与输入同量级计
+    return max(1, len(prompt) // 4) * 2
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    # Full jitter: 在 [0, min(cap, base * 2^attempt)] 内均匀取值, 打散重试风暴
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount, now):
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens=1):
+        # 排队取令牌 (先到先得), 暂停期间所有请求一起等待
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = max(self.paused_until - now,
+                           self.requests.delay_for(1, now),
+                           self.tokens.delay_for(tokens, now))
+                if wait <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(tokens)
+                    return
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+_limiters = {}   # model -> (事件循环, RateLimiter)
+
+
+def get_rate_limiter(model_name):
+    # asyncio.Lock 绑定创建时的事件循环; 同一进程里多次 asyncio.run (压测连续跑几轮) 时按新循环重建
+    loop = asyncio.get_running_loop()
+    entry = _limiters.get(model_name)
+    if entry is None or entry[0] is not loop:
+        budget = MODEL_BUDGETS.get(model_name, DEFAULT_BUDGET)
+        entry = _limiters[model_name] = (loop, RateLimiter(budget["rpm"], budget["tpm"]))
+    return entry[1]
+
+
+def validate_budgets(overrides):
+    # 只接受 {"model": {"rpm": 正数, "tpm": 正数}}; 返回 (合法部分, 被跳过的条目说明)
+    if not isinstance(overrides, dict):
+        return {}, [f"rate_limits 应为对象: {overrides!r}"]
+    valid, skipped = {}, []
+    for model_name, budget in overrides.items():
+        if not isinstance(budget, dict):
+            skipped.append(f"{model_name}: {budget!r}")
+            continue
+        entry = {}
+        for key in ("rpm", "tpm"):
+            value = budget.get(key)
+            if value is None: continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not value > 0:
+                skipped.append(f"{model_name}.{key}: {value!r}")
+                continue
+            entry[key] = value
+        if entry: valid[model_name] = entry
+    return valid, skipped
+
+
+def set_model_budgets(overrides):
+    # 每次都从默认预算 + 当前覆盖重建 (配置里删掉的条目恢复默认); 非法条目跳过并提示
+    valid, skipped = validate_budgets(overrides)
+    if skipped:
+        print(f"⚠️ rate_limits 里的非法条目已忽略: {'; '.join(skipped)}")
+    budgets = {model: dict(budget) for model, budget in BASE_BUDGETS.items()}
+    for model_name, budget in valid.items():
+        budgets[model_name] = dict(budgets.get(model_name, DEFAULT_BUDGET), **budget)
+    changed = {m for m in set(budgets) | set(MODEL_BUDGETS) if budgets.get(m) != MODEL_BUDGETS.get(m)}
+    MODEL_BUDGETS.clear()
+    MODEL_BUDGETS.update(budgets)
+    for model_name in changed:
+        _limiters.pop(model_name, None)
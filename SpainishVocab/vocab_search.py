@@ -0,0 +1,133 @@
+import json
+import re
+import sqlite3
+
+from vocab_lemma import fold_word
+
+# ================= 全文检索 (FTS5) =================
+# vocab_fts 是 vocab_staging 的外部内容索引 (只存倒排, 不复制正文), 由触发器随增删改同步。
+# unicode61 + remove_diacritics 2: "camion" 能搜到 "camión"; prefix='2 3' 让短前缀查询也走索引。
+# 排序时词条本身等于查询 (含只差大小写/重音, "camion" -> camión) 的排最前, 再按 bm25; 否则释义里
+# 反复出现查询词的派生词 (camionero) 会压过词条本身。
+# 注意: vocab_staging 没有显式 INTEGER 主键, VACUUM 之后 rowid 可能变化, 需要调用 rebuild_search_index。
+
+SEARCH_COLUMNS = ("word", "hint", "definition_cn", "context")
+SEARCH_WEIGHTS = (10.0, 4.0, 2.0, 1.0)     # bm25 列权重, 与 SEARCH_COLUMNS 对应
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+RANK_LIMIT = 3000      # 匹配行超过该数量时不再对全部结果算 bm25 (每行约 2 µs), 宽泛查询保持在十几 ms
+
+_cols = ", ".join(SEARCH_COLUMNS)
+_new = ", ".join(f"NEW.{c}" for c in SEARCH_COLUMNS)
+_old = ", ".join(f"OLD.{c}" for c in SEARCH_COLUMNS)
+SEARCH_TRIGGERS = {
+    "trg_fts_insert": f"AFTER INSERT ON vocab_staging BEGIN INSERT INTO vocab_fts (rowid, {_cols}) VALUES (NEW.rowid, {_new}); END",
+    "trg_fts_delete": f"AFTER DELETE ON vocab_staging BEGIN INSERT INTO vocab_fts (vocab_fts, rowid, {_cols}) VALUES ('delete', OLD.rowid, {_old}); END",
+    "trg_fts_update": f"""AFTER UPDATE OF {_cols} ON vocab_staging BEGIN
+        INSERT INTO vocab_fts (vocab_fts, rowid, {_cols}) VALUES ('delete', OLD.rowid, {_old});
+        INSERT INTO vocab_fts (rowid, {_cols}) VALUES (NEW.rowid, {_new});
+    END""",
+}
+
+
+def ensure_search_schema(conn):
+    # 只补建缺失的对象; SQLite 未编译 FTS5 时返回 False, 搜索接口据此报错
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    if "vocab_fts" not in existing:
+        try:
+            conn.execute(f"""CREATE VIRTUAL TABLE vocab_fts USING fts5({_cols},
+                content='vocab_staging', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3')""")
+        except sqlite3.OperationalError:
+            return False
+        rebuild_search_index(conn)
+    for name, body in SEARCH_TRIGGERS.items():
+        if name not in existing:
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+    conn.commit()
+    return True
+
+
+def rebuild_search_index(conn):
+    conn.execute("INSERT INTO vocab_fts (vocab_fts) VALUES ('rebuild')")
+
+
+def build_match_query(text):
+    # 每个词都按前缀匹配, 词与词之间是 AND; 加引号避免用户输入被当成 FTS 语法
+    terms = re.findall(r"\w+", text or "")
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def _count(conn, match, status):
+    if status:
+        return conn.execute("SELECT count(*) FROM vocab_fts JOIN vocab_staging s ON s.rowid = vocab_fts.rowid WHERE vocab_fts MATCH ? AND s.status = ?",
+                            (match, status)).fetchone()[0]
+    return conn.execute("SELECT count(*) FROM vocab_fts WHERE vocab_fts MATCH ?", (match,)).fetchone()[0]
+
+
+def _page_ids(conn, match, offset, limit, order, status, text=""):
+    # 只取当前页的 (rowid, score)。order: "rank" 按 bm25; "length" 按词长 (宽泛查询里的词条命中);
+    # None 按索引自然顺序。后两者都不算 bm25 —— 它首次调用要统计全部匹配行的词频
+    # 传了 text 时都先放词条命中 (原样或折叠后等于查询); CASE 按顺序求值, 只有长度相同的词才调用 fold_word
+    weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+    where = "vocab_fts MATCH ?" + (" AND s.status = ?" if status else "")
+    params = [match] + ([status] if status else []) + [limit, offset]
+    text = text.strip()
+    folded = fold_word(text)
+    headword = "(CASE WHEN s.word = ? THEN 1 WHEN length(s.word) = ? THEN fold_word(s.word) = ? ELSE 0 END) DESC"
+    if order == "rank":
+        # 同分时短词在前 ("camion" -> camión 排在 camiones 之前)
+        sql = f"""SELECT vocab_fts.rowid, bm25(vocab_fts, {weights}) AS score FROM vocab_fts JOIN vocab_staging s ON s.rowid = vocab_fts.rowid
+                  WHERE {where} ORDER BY {headword}, score, length(s.word) LIMIT ? OFFSET ?"""
+        params[-2:-2] = [text, len(text), folded]
+    elif order == "length":
+        sql = f"""SELECT vocab_fts.rowid, NULL FROM vocab_fts JOIN vocab_staging s ON s.rowid = vocab_fts.rowid
+                  WHERE {where} ORDER BY {headword}, length(s.word), s.word LIMIT ? OFFSET ?"""
+        params[-2:-2] = [text, len(text), folded]
+    elif text:
+        sql = f"""SELECT vocab_fts.rowid, NULL FROM vocab_fts JOIN vocab_staging s ON s.rowid = vocab_fts.rowid
+                  WHERE {where} ORDER BY {headword} LIMIT ? OFFSET ?"""
+        params[-2:-2] = [text, len(text), folded]
+    else:
+        join = "JOIN vocab_staging s ON s.rowid = vocab_fts.rowid" if status else ""
+        sql = f"SELECT vocab_fts.rowid, NULL FROM vocab_fts {join} WHERE {where} LIMIT ? OFFSET ?"
+    return conn.execute(sql, params).fetchall()
+
+
+def search_words(conn, text, page=1, per_page=SEARCH_PAGE_SIZE, status=None):
+    match = build_match_query(text)
+    per_page = max(1, min(int(per_page), SEARCH_MAX_PAGE_SIZE))
+    page = max(1, int(page))
+    if not match:
+        return {"query": text, "total": 0, "page": page, "per_page": per_page, "results": []}
+
+    conn.create_function("fold_word", 1, fold_word, deterministic=True)
+    offset = (page - 1) * per_page
+    total = _count(conn, match, status)
+    if total <= RANK_LIMIT:
+        hits = _page_ids(conn, match, offset, per_page, "rank", status, text)
+    else:
+        # 匹配太多 (例如 "de"): 先列词条本身命中的 (短词在前), 再按自然顺序列其余命中的 (例句/释义里出现的)
+        head = f"{{word}} : ({match})"
+        n_head = _count(conn, head, status)
+        hits = []
+        if offset < n_head:
+            hits = _page_ids(conn, head, offset, per_page, "length" if n_head <= RANK_LIMIT else None, status, text)
+        if len(hits) < per_page:
+            hits += _page_ids(conn, f"({match}) NOT {head}", max(0, offset - n_head), per_page - len(hits), None, status)
+
+    rows = {}
+    if hits:
+        placeholders = ",".join("?" * len(hits))
+        rows = {r[0]: r[1:] for r in conn.execute(
+            f"SELECT rowid, word, level, hint, definition_cn, context, tags, status FROM vocab_staging WHERE rowid IN ({placeholders})",
+            [rowid for rowid, score in hits])}
+    results = []
+    for rowid, score in hits:
+        if rowid not in rows: continue
+        word, level, hint, definition_cn, context, tags, row_status = rows[rowid]
+        results.append({
+            "word": word, "level": level, "hint": hint, "definition_cn": definition_cn, "context": context,
+            "tags": json.loads(tags) if tags else [], "status": row_status, "score": round(score, 4) if score is not None else None,
+        })
+    return {"query": text, "total": total, "page": page, "per_page": per_page, "results": results}
@@ -0,0 +1,83 @@
+import sqlite3
+
+# ================= 状态计数表 =================
+# vocab_counters 由触发器随 vocab_staging 的 INSERT/DELETE/UPDATE 增量维护,
+# /api/stats 只需读 6 行, 耗时与词库大小无关。
+
+# 计数名 -> 某一行是否计入该计数的表达式 ({r} 替换为 NEW / OLD)
+COUNTER_EXPRS = {
+    "total": "1",
+    "processed": "({r}.processed_flag IS 1)",
+    "errors": "({r}.processed_flag IS 2)",
+    "kept": "({r}.status IS 'keep' AND {r}.processed_flag IS 1)",
+    "discarded": "({r}.status IS 'discard' AND {r}.processed_flag IS 1)",
+    "translated": "({r}.status IS 'keep' AND {r}.translated_flag IS 1)",
+}
+
+STAGING_INDEXES = {
+    "idx_staging_processed": "vocab_staging (processed_flag)",
+    "idx_staging_status_translated": "vocab_staging (status, translated_flag)",
+    # 部分索引与最近日志查询的 WHERE 完全一致
+    "idx_staging_recent": "vocab_staging (updated_at) WHERE processed_flag IN (1, 2)",
+}
+
+
+def _delta_case(new_row, old_row):
+    parts = []
+    for name, expr in COUNTER_EXPRS.items():
+        plus = expr.format(r=new_row) if new_row else "0"
+        minus = expr.format(r=old_row) if old_row else "0"
+        parts.append(f"WHEN '{name}' THEN {plus} - {minus}")
+    return "CASE name " + " ".join(parts) + " ELSE 0 END"
+
+
+def install_counters(conn):
+    cursor = conn.cursor()
+    for name, target in STAGING_INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+    cursor.execute("CREATE TABLE IF NOT EXISTS vocab_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)")
+    triggers = {
+        "trg_counters_insert": ("AFTER INSERT ON vocab_staging", _delta_case("NEW", None)),
+        "trg_counters_delete": ("AFTER DELETE ON vocab_staging", _delta_case(None, "OLD")),
+        "trg_counters_update": ("AFTER UPDATE OF processed_flag, status, translated_flag ON vocab_staging", _delta_case("NEW", "OLD")),
+    }
+    for name, (event, delta) in triggers.items():
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name} {event}
+            BEGIN
+                UPDATE vocab_counters SET value = value + ({delta});
+            END
+        """)
+    refresh_counters(conn)
+
+
+def refresh_counters(conn):
+    # 全表重算一次 (启动时调用), 修正触发器安装之前或绕过触发器的改动
+    selects = ", ".join(f"SUM({expr.format(r='vocab_staging')})" for expr in COUNTER_EXPRS.values())
+    row = conn.execute(f"SELECT {selects} FROM vocab_staging").fetchone()
+    conn.executemany("INSERT OR REPLACE INTO vocab_counters (name, value) VALUES (?, ?)",
+                     [(name, value or 0) for name, value in zip(COUNTER_EXPRS, row)])
+    conn.commit()
+
+
+def read_counters(conn):
+    try:
+        return {name: value for name, value in conn.execute("SELECT name, value FROM vocab_counters")}
+    except sqlite3.OperationalError:
+        # 旧库还没有计数表 (worker 尚未以新版本启动过), 退回全表统计
+        selects = ", ".join(f"SUM({expr.format(r='vocab_staging')})" for expr in COUNTER_EXPRS.values())
+        row = conn.execute(f"SELECT {selects} FROM vocab_staging").fetchone()
+        return {name: value or 0 for name, value in zip(COUNTER_EXPRS, row)}
+
+
+RECENT_LOGS_QUERY = """SELECT word, tags, status, level, updated_at, processed_flag FROM vocab_staging {hint}
+                       WHERE processed_flag IN (1, 2) ORDER BY updated_at DESC LIMIT ?"""
+
+
+def read_recent_logs(conn, limit=50):
+    # 没有 ANALYZE 统计时规划器会走 processed_flag 索引再整体排序, 这里显式指定部分索引
+    try:
+        return conn.execute(RECENT_LOGS_QUERY.format(hint="INDEXED BY idx_staging_recent"), (limit,)).fetchall()
+    except sqlite3.OperationalError:
+        return conn.execute(RECENT_LOGS_QUERY.format(hint=""), (limit,)).fetchall()
@@ -0,0 +1,156 @@
+import asyncio
+import concurrent.futures
+import queue
+import sqlite3
+import threading
+import time
+
+from vocab_metrics import DB_BUCKETS, METRICS
+
+# ================= 后台写库线程 (write-behind) =================
+# 事件循环只负责把完成的 chunk 丢进队列; 写线程用自己的连接把结果攒成一组,
+# 达到 GROUP_COMMIT_SIZE 个 chunk 或等了 GROUP_COMMIT_SECONDS 秒就一次性提交。
+# WAL + synchronous=NORMAL: 每次提交不再 fsync, 只有检查点时才落盘; 关闭时做一次 TRUNCATE 检查点。
+# 领取/续租等其他写操作也通过 call() 交给同一个线程执行 (单写者), 事件循环不会因为锁等待而被阻塞。
+# 一组提交失败 (重试后仍失败) 时逐个重写: 好的结果照常落库, 写不进去的那个交给 fail_fn 标记为错误并释放租约,
+# 不会因为一个坏结果把整组丢掉、反复领取。每个结果最终是成功还是失败, 事件循环用 take_done() 取回 (例如成功后才写缓存)。
+
+GROUP_COMMIT_SIZE = 4         # 一组最多合并多少个 chunk; 太大会让排队的领取请求等整组写完
+GROUP_COMMIT_SECONDS = 0.1    # 第一个 chunk 到达后最多等多久就提交
+WAL_AUTOCHECKPOINT = 4000     # 页数; 比默认 1000 大, 减少检查点对写入的打断
+WRITE_RETRIES = 3
+
+
+class DBWriter(threading.Thread):
+    def __init__(self, db_path, save_fn, fail_fn=None, group_size=GROUP_COMMIT_SIZE, group_seconds=GROUP_COMMIT_SECONDS):
+        # save_fn(cursor, item) 在写事务里执行单个结果, 返回要打印的一行日志 (或 None)
+        # fail_fn(cursor, item, error) 在 save_fn 写不进去时执行 (标记错误/释放租约), 同样返回日志行
+        super().__init__(name="vocab-db-writer", daemon=True)
+        self.db_path = db_path
+        self.save_fn = save_fn
+        self.fail_fn = fail_fn
+        self.group_size = group_size
+        self.group_seconds = group_seconds
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.unfinished = 0
+        self.saved = []
+        self.failed = []
+
+    def submit(self, item):
+        with self.lock:
+            self.unfinished += 1
+        self.queue.put(("save", item))
+
+    async def call(self, fn, *args):
+        # 在写线程里立即执行 fn(conn, *args) 并提交 (不等当前这组结果), 返回 fn 的返回值
+        future = concurrent.futures.Future()
+        self.queue.put(("call", (fn, args, future)))
+        return await asyncio.wrap_future(future)
+
+    def take_done(self):
+        # 取走自上次以来已提交的结果: (成功的 item 列表, 失败的 item 列表)
+        with self.lock:
+            saved, failed = self.saved, self.failed
+            self.saved, self.failed = [], []
+        return saved, failed
+
+    def idle(self):
+        with self.lock:
+            return self.unfinished == 0
+
+    def close(self):
+        # 排在所有已提交结果之后, 写线程处理完剩余结果、做完检查点才退出
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL;')
+        conn.execute('PRAGMA synchronous=NORMAL;')
+        conn.execute(f'PRAGMA wal_autocheckpoint={WAL_AUTOCHECKPOINT};')
+        try:
+            group = []
+            deadline = None
+            while True:
+                timeout = None if not group else max(0.0, deadline - time.monotonic())
+                try:
+                    entry = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    entry = ("flush", None)
+                if entry is None:
+                    break
+                kind, payload = entry
+                if kind == "save":
+                    if not group: deadline = time.monotonic() + self.group_seconds
+                    group.append(payload)
+                elif kind == "call":
+                    self.run_call(conn, *payload)
+                if group and (kind == "flush" or len(group) >= self.group_size or time.monotonic() >= deadline):
+                    self.write_group(conn, group)
+                    group = []
+            if group:
+                self.write_group(conn, group)
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+
+    def run_call(self, conn, fn, args, future):
+        if not future.set_running_or_notify_cancel():
+            return   # 调用方已取消 (例如 worker 正在退出)
+        try:
+            result = fn(conn, *args)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            future.set_exception(e)
+            return
+        future.set_result(result)
+
+    def write_group(self, conn, group):
+        result = None
+        for attempt in range(WRITE_RETRIES):
+            start = time.monotonic()
+            try:
+                cursor = conn.cursor()
+                logs = [self.save_fn(cursor, item) for item in group]
+                conn.commit()
+                result = (logs, group, [])
+                break
+            except Exception as e:
+                conn.rollback()
+                print(f"  ⚠️ 写库失败 ({attempt+1}/{WRITE_RETRIES}): {e}")
+                if not isinstance(e, sqlite3.OperationalError): break   # 数据本身写不进去 (绑定失败等), 重试也没用
+                time.sleep(0.5 * (attempt + 1))
+        if result is None:
+            result = self.write_each(conn, group)
+        logs, saved, failed = result
+        METRICS.observe("vocab_db_commit_seconds", time.monotonic() - start, buckets=DB_BUCKETS)
+        METRICS.observe("vocab_db_group_size", len(group), buckets=(1, 2, 5, 10, 20, 50))
+        for line in logs:
+            if line: print(line)
+        with self.lock:
+            self.saved.extend(saved)
+            self.failed.extend(failed)
+            self.unfinished -= len(group)
+
+    def write_each(self, conn, group):
+        # 整组失败后逐个提交, 找出写不进去的那个结果
+        logs, saved, failed = [], [], []
+        for item in group:
+            try:
+                logs.append(self.save_fn(conn.cursor(), item))
+                conn.commit()
+                saved.append(item)
+                continue
+            except Exception as e:
+                conn.rollback()
+                error = e
+            failed.append(item)
+            try:
+                logs.append(self.fail_fn(conn.cursor(), item, error) if self.fail_fn else f"  ❌ 写库放弃 1 个 chunk: {error}")
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logs.append(f"  ❌ 写库放弃 1 个 chunk, 标记错误也失败: {e}")
+        return logs, saved, failed